@@ -1,161 +1,146 @@
 """Configuration management."""
 
+import copy
 import os
+from functools import lru_cache
+from threading import Lock
 from typing import Any
 
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader  # libyaml C parser
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
+
+# Parsed YAML per config path, reused while the file's mtime is unchanged.
+# Never handed out directly - _parse_yaml() returns a copy per Config.
+_yaml_cache: dict[str, tuple[int, dict[str, Any]]] = {}
+
+# Known settings as (attribute, key path, default). Key paths are pre-split so
+# load() can resolve every setting once instead of re-walking the YAML tree on
+# each access from the request hot path.
+_SETTINGS: tuple[tuple[str, tuple[str, ...], Any], ...] = (
+    # Radio / DLNA defaults
+    ('default_stream_url', ('radio', 'default_url'), ''),
+    ('default_device_ip', ('dlna', 'default_device_ip'), ''),
+    # Flask server
+    ('server_host', ('server', 'host'), '0.0.0.0'),
+    ('server_port', ('server', 'port'), 5000),
+    # Streaming server
+    ('stream_port', ('streaming', 'internal_port'), 8080),
+    ('mp3_bitrate', ('streaming', 'mp3_bitrate'), '128k'),
+    ('stream_external_url', ('streaming', 'external_url'), ''),  # Overrides auto-detection
+    # Timeout settings (seconds)
+    ('http_request_timeout', ('timeouts', 'http_request'), 10),
+    ('stream_detection_timeout', ('timeouts', 'stream_detection'), 5),
+    ('device_discovery_timeout', ('timeouts', 'device_discovery'), 10),
+    ('ffmpeg_startup_timeout', ('timeouts', 'ffmpeg_startup'), 10),
+    # Security settings
+    ('rate_limit_enabled', ('security', 'rate_limit_enabled'), False),
+    ('rate_limit_default', ('security', 'rate_limit_default'), '100 per hour'),
+    ('api_auth_enabled', ('security', 'api_auth_enabled'), False),
+    ('api_key', ('security', 'api_key'), ''),
+    # Performance settings
+    ('gunicorn_workers', ('performance', 'gunicorn_workers'), 1),
+    ('gunicorn_threads', ('performance', 'gunicorn_threads'), 4),
+    ('connection_pool_size', ('performance', 'connection_pool_size'), 16),
+    ('connection_pool_maxsize', ('performance', 'connection_pool_maxsize'), 32),
+    # FFmpeg settings
+    ('ffmpeg_chunk_size', ('ffmpeg', 'chunk_size'), 8192),
+    ('ffmpeg_max_stderr_lines', ('ffmpeg', 'max_stderr_lines'), 1000),
+    ('ffmpeg_protocol_whitelist', ('ffmpeg', 'protocol_whitelist'), 'http,https,tcp,tls'),
+    # Storage settings
+    ('data_dir', ('storage', 'data_dir'), '/data'),
+    ('stream_cache_ttl', ('storage', 'stream_cache_ttl'), 86400),  # 24 hours default
+)
+
+
+@lru_cache(maxsize=256)
+def _key_path(key: str) -> tuple[str, ...]:
+    """Split a dotted key once; repeated get() calls reuse the compiled path."""
+    return tuple(key.split('.'))
+
+
+def _parse_yaml(path: str, mtime_ns: int) -> dict[str, Any]:
+    """Parse a YAML file, reusing the cached result if it hasn't changed on disk."""
+    cached = _yaml_cache.get(path)
+    if cached is None or cached[0] != mtime_ns:
+        with open(path) as f:
+            cached = (mtime_ns, yaml.load(f, Loader=SafeLoader) or {})
+        _yaml_cache[path] = cached
+    return copy.deepcopy(cached[1])  # Callers may mutate their config data
+
+
+def _lookup(data: dict[str, Any], path: tuple[str, ...], default: Any) -> Any:
+    """Walk a pre-split key path through nested dicts."""
+    value = data
+    for k in path:
+        if isinstance(value, dict):
+            value = value.get(k)
+        else:
+            return default
+        if value is None:
+            return default
+    return value
+
 
 class Config:
-    """Application configuration."""
+    """
+    Application configuration.
+
+    Every known setting is resolved once in load() and exposed as a plain
+    attribute (e.g. ``config.mp3_bitrate``), so reads on hot paths are a
+    single attribute load. Use get() for ad-hoc dotted keys.
+
+    Use Config.instance() to share one process-wide configuration.
+    """
+
+    __slots__ = ('config_path', 'data') + tuple(attr for attr, _, _ in _SETTINGS)
+
+    _instance: 'Config | None' = None
+    _instance_lock = Lock()
 
     def __init__(self, config_path: str = "config.yaml"):
         self.config_path = config_path
         self.data: dict[str, Any] = {}
         self.load()
 
+    @classmethod
+    def instance(cls, config_path: str = "config.yaml") -> 'Config':
+        """
+        Get the shared configuration, loading it on first use.
+
+        Args:
+            config_path: Path to YAML file; later calls must pass the same path
+
+        Returns:
+            Process-wide Config instance
+
+        Raises:
+            ValueError: If the shared configuration was loaded from another path
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:  # Double-checked - another thread may have won
+                    cls._instance = cls(config_path)
+        if os.path.abspath(config_path) != os.path.abspath(cls._instance.config_path):
+            raise ValueError(f"Shared config already loaded from {cls._instance.config_path}, "
+                             f"not {config_path}")
+        return cls._instance
+
     def load(self):
-        """Load configuration from YAML file."""
-        if os.path.exists(self.config_path):
-            with open(self.config_path) as f:
-                self.data = yaml.safe_load(f) or {}
-        else:
+        """Load configuration from YAML file and resolve known settings."""
+        try:
+            mtime_ns = os.stat(self.config_path).st_mtime_ns
+        except FileNotFoundError:
             self.data = {}
+        else:
+            self.data = _parse_yaml(os.path.abspath(self.config_path), mtime_ns)
+
+        for attr, path, default in _SETTINGS:
+            setattr(self, attr, _lookup(self.data, path, default))
 
     def get(self, key: str, default: Any = None) -> Any:
         """Get configuration value."""
-        keys = key.split('.')
-        value = self.data
-        for k in keys:
-            if isinstance(value, dict):
-                value = value.get(k)
-            else:
-                return default
-            if value is None:
-                return default
-        return value
-
-    @property
-    def default_stream_url(self) -> str:
-        """Get default radio stream URL."""
-        return self.get('radio.default_url', '')
-
-    @property
-    def default_device_ip(self) -> str:
-        """Get default DLNA device IP address."""
-        return self.get('dlna.default_device_ip', '')
-
-    @property
-    def server_host(self) -> str:
-        """Get Flask server host."""
-        return self.get('server.host', '0.0.0.0')
-
-    @property
-    def server_port(self) -> int:
-        """Get Flask server port."""
-        return self.get('server.port', 5000)
-
-    @property
-    def stream_port(self) -> int:
-        """Get streaming server internal port."""
-        return self.get('streaming.internal_port', 8080)
-
-    @property
-    def mp3_bitrate(self) -> str:
-        """Get MP3 encoding bitrate."""
-        return self.get('streaming.mp3_bitrate', '128k')
-
-    @property
-    def stream_external_url(self) -> str:
-        """Get external URL for stream (optional, overrides auto-detection)."""
-        return self.get('streaming.external_url', '')
-
-    # Timeout settings
-    @property
-    def http_request_timeout(self) -> int:
-        """Get HTTP request timeout in seconds."""
-        return self.get('timeouts.http_request', 10)
-
-    @property
-    def stream_detection_timeout(self) -> int:
-        """Get stream detection timeout in seconds."""
-        return self.get('timeouts.stream_detection', 5)
-
-    @property
-    def device_discovery_timeout(self) -> int:
-        """Get device discovery timeout in seconds."""
-        return self.get('timeouts.device_discovery', 10)
-
-    @property
-    def ffmpeg_startup_timeout(self) -> int:
-        """Get FFmpeg startup timeout in seconds."""
-        return self.get('timeouts.ffmpeg_startup', 10)
-
-    # Security settings
-    @property
-    def rate_limit_enabled(self) -> bool:
-        """Check if rate limiting is enabled."""
-        return self.get('security.rate_limit_enabled', False)
-
-    @property
-    def rate_limit_default(self) -> str:
-        """Get default rate limit."""
-        return self.get('security.rate_limit_default', '100 per hour')
-
-    @property
-    def api_auth_enabled(self) -> bool:
-        """Check if API authentication is enabled."""
-        return self.get('security.api_auth_enabled', False)
-
-    @property
-    def api_key(self) -> str:
-        """Get API key."""
-        return self.get('security.api_key', '')
-
-    # Performance settings
-    @property
-    def gunicorn_workers(self) -> int:
-        """Get number of Gunicorn workers."""
-        return self.get('performance.gunicorn_workers', 1)
-
-    @property
-    def gunicorn_threads(self) -> int:
-        """Get number of threads per Gunicorn worker."""
-        return self.get('performance.gunicorn_threads', 4)
-
-    @property
-    def connection_pool_size(self) -> int:
-        """Get HTTP connection pool size."""
-        return self.get('performance.connection_pool_size', 10)
-
-    @property
-    def connection_pool_maxsize(self) -> int:
-        """Get HTTP connection pool max size."""
-        return self.get('performance.connection_pool_maxsize', 20)
-
-    # FFmpeg settings
-    @property
-    def ffmpeg_chunk_size(self) -> int:
-        """Get FFmpeg chunk size for streaming."""
-        return self.get('ffmpeg.chunk_size', 8192)
-
-    @property
-    def ffmpeg_max_stderr_lines(self) -> int:
-        """Get max FFmpeg stderr lines to buffer."""
-        return self.get('ffmpeg.max_stderr_lines', 1000)
-
-    @property
-    def ffmpeg_protocol_whitelist(self) -> str:
-        """Get FFmpeg protocol whitelist."""
-        return self.get('ffmpeg.protocol_whitelist', 'http,https,tcp,tls')
-
-    # Storage settings
-    @property
-    def data_dir(self) -> str:
-        """Get data directory for persistent storage."""
-        return self.get('storage.data_dir', '/data')
-
-    @property
-    def stream_cache_ttl(self) -> int:
-        """Get stream format cache TTL in seconds."""
-        return self.get('storage.stream_cache_ttl', 86400)  # 24 hours default
+        return _lookup(self.data, _key_path(key), default)
@@ -1,159 +1,352 @@
 """Device state management with persistence."""
 
+import atexit
 import fcntl
 import json
 import logging
+import mmap
 import os
 import time
-from threading import Lock
-from typing import Any
+from collections.abc import Iterable, Mapping
+from threading import Event, Lock, Thread
+from types import MappingProxyType
+from typing import Any, NamedTuple
+
+try:
+    import orjson
+except ImportError:  # Optional - stdlib json is used when orjson is not installed
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# fdatasync skips the metadata flush fsync does; not available on macOS
+_fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+# Read-only view of a device info dict, shared with callers instead of copied
+DeviceInfo = Mapping[str, Any]
+
+
+class State(NamedTuple):
+    """Immutable snapshot of device state, swapped atomically on every change."""
+
+    current_device: DeviceInfo | None = None
+    cached_devices: tuple[DeviceInfo, ...] = ()
+    devices_by_ip: Mapping[str, DeviceInfo] = MappingProxyType({})  # Index over cached_devices
+    last_scan_time: float | None = None
+    file_id: tuple[int, int] = (-1, -1)  # (inode, mtime) of the state file this snapshot was loaded from or written to
+
+
+def _index_by_ip(devices: tuple[DeviceInfo, ...]) -> Mapping[str, DeviceInfo]:
+    """Build an IP -> device index; the first cached device wins for duplicate IPs."""
+    index: dict[str, DeviceInfo] = {}
+    for device in devices:
+        ip = device.get('ip')
+        if ip:
+            index.setdefault(ip, device)
+    return MappingProxyType(index)
+
+
+def _dumps(data: dict[str, Any]) -> bytes:
+    """Serialize state to indented JSON bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode('utf-8')
+
+
+def _loads(raw: memoryview) -> Any:
+    """Parse JSON state from a buffer (orjson parses it in place when available)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(bytes(raw))
+
+
+def _file_id(st: os.stat_result) -> tuple[int, int]:
+    """Identify a state file version; every atomic replace gets a new inode even within one mtime tick."""
+    return st.st_ino, st.st_mtime_ns
+
+
+def _freeze(device_info: Mapping[str, Any]) -> DeviceInfo:
+    """Snapshot a device dict into a read-only view (copy once on ingress)."""
+    if isinstance(device_info, MappingProxyType):
+        return device_info
+    return MappingProxyType(dict(device_info))
+
 
 class DeviceManager:
-    """Manages selected DLNA device with persistence to state.json."""
+    """
+    Manages selected DLNA device with persistence to state.json.
+
+    All state lives in a single immutable ``State`` record. Writers build a new
+    record under ``lock`` and swap the reference; readers take one attribute
+    load of ``_state`` and never lock, since the reference swap is atomic.
+
+    Devices are stored as read-only views (copy-on-write): getters hand out the
+    shared view directly, and callers that want to modify a device build a new
+    dict (e.g. ``{**device, 'capabilities': caps}``) and pass it back in.
+
+    Mutations only update memory and mark the state dirty; a background writer
+    thread coalesces them into one state file write after ``save_delay``
+    seconds. Call flush() to persist synchronously, or close() to also stop the
+    writer (done at exit for managers that are never closed).
+    """
 
-    def __init__(self, state_file: str = "/app/state.json"):
+    __slots__ = ('state_file', 'save_delay', '_state', 'lock', '_dirty', '_writer', '_closed')
+
+    def __init__(self, state_file: str = "/app/state.json", save_delay: float = 0.5):
+        """
+        Initialize device manager.
+
+        Args:
+            state_file: Path to JSON state file
+            save_delay: Seconds to coalesce mutations before writing (0 = write synchronously)
+        """
         self.state_file = state_file
-        self.current_device: dict[str, Any] | None = None
-        self.cached_devices: list[dict[str, Any]] = []  # Cache of discovered devices
-        self.last_scan_time: float | None = None
-        self.lock = Lock()
+        self.save_delay = save_delay
+        self._state = State()
+        self.lock = Lock()  # Serializes writers only
+        self._dirty = Event()  # Set while in-memory state has unsaved changes
+        self._writer: Thread | None = None
+        self._closed = False  # Set by close(); later mutations are saved synchronously
         logger.info(f"DeviceManager initialized with state file: {self.state_file}")
         self._load_state()
 
+    @property
+    def current_device(self) -> DeviceInfo | None:
+        """Currently selected device (read-only view)."""
+        return self._state.current_device
+
+    @property
+    def cached_devices(self) -> tuple[DeviceInfo, ...]:
+        """Cache of discovered devices (read-only views)."""
+        return self._state.cached_devices
+
+    @property
+    def last_scan_time(self) -> float | None:
+        """Timestamp of the last device cache update."""
+        return self._state.last_scan_time
+
     def _load_state(self):
-        """Load device state from JSON file with process-level locking."""
+        """
+        Load device state from JSON file with process-level locking.
+
+        The file is only re-parsed when it was replaced since the last load or
+        save, so the common unchanged case costs a single stat() call. Skipped
+        while local changes are pending so they aren't overwritten.
+        """
+        if self._dirty.is_set():
+            return
+
+        seen = self._state
         try:
-            if os.path.exists(self.state_file):
-                with open(self.state_file, 'r') as f:
-                    # Acquire shared lock for reading (multiple readers allowed)
-                    fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-                    try:
-                        data = json.load(f)
-                        self.current_device = data.get('current_device')
-                        self.cached_devices = data.get('cached_devices', [])
-                        self.last_scan_time = data.get('last_scan_time')
-
-                        if self.current_device:
-                            logger.debug(f"Loaded saved device: {self.current_device.get('friendly_name', 'Unknown')}")
-
-                        if self.cached_devices:
-                            logger.debug(f"Loaded {len(self.cached_devices)} cached devices from state file")
-                        else:
-                            logger.debug("No cached devices in state file")
-                    finally:
-                        # Release lock
-                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            try:
+                st = os.stat(self.state_file)
+            except FileNotFoundError:
+                logger.debug("State file %s does not exist yet", self.state_file)
+                return
+
+            if _file_id(st) == seen.file_id:
+                return  # Unchanged since last load/save
+
+            # Map the file and parse straight from the page cache (no read buffer copy)
+            fd = os.open(self.state_file, os.O_RDONLY)
+            try:
+                # Acquire shared lock for reading (multiple readers allowed)
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                try:
+                    st = os.fstat(fd)
+                    with mmap.mmap(fd, st.st_size, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                        data = _loads(view)
+                    file_id = _file_id(st)
+                finally:
+                    # Release lock
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+            current_device = data.get('current_device')
+            cached_devices = tuple(_freeze(d) for d in data.get('cached_devices', []))
+            state = State(
+                current_device=_freeze(current_device) if current_device else None,
+                cached_devices=cached_devices,
+                devices_by_ip=_index_by_ip(cached_devices),
+                last_scan_time=data.get('last_scan_time'),
+                file_id=file_id
+            )
+            with self.lock:
+                if self._state is not seen:
+                    return  # A local write won the race - keep the newer in-memory state
+                self._state = state
+
+            if state.current_device:
+                logger.debug("Loaded saved device: %s", state.current_device.get('friendly_name', 'Unknown'))
+
+            if state.cached_devices:
+                logger.debug("Loaded %d cached devices from state file", len(state.cached_devices))
             else:
-                logger.debug(f"State file {self.state_file} does not exist yet")
+                logger.debug("No cached devices in state file")
         except Exception as e:
             logger.warning(f"Failed to load state file {self.state_file}: {e}")
-            self.current_device = None
-            self.cached_devices = []
-            self.last_scan_time = None
+            with self.lock:
+                if self._state is seen:
+                    self._state = State()
 
     def _save_state(self):
-        """Save device state to JSON file with process-level locking."""
+        """Save device state to JSON file with process-level locking (caller must hold self.lock)."""
         try:
-            # Ensure parent directory exists
-            state_dir = os.path.dirname(self.state_file)
-            if state_dir and not os.path.exists(state_dir):
-                os.makedirs(state_dir, exist_ok=True)
-                logger.info(f"Created state directory: {state_dir}")
+            state = self._state
 
             data = {
-                'current_device': self.current_device,
-                'cached_devices': self.cached_devices,
-                'last_scan_time': self.last_scan_time
+                'current_device': dict(state.current_device) if state.current_device else None,
+                'cached_devices': [dict(d) for d in state.cached_devices],
+                'last_scan_time': state.last_scan_time
             }
 
+            # Serialize up front so the file is written with a single write() call
+            buf = memoryview(_dumps(data))
+
             # Write to temporary file first, then rename (atomic operation)
             temp_file = f"{self.state_file}.tmp"
-            with open(temp_file, 'w') as f:
+            flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+            try:
+                fd = os.open(temp_file, flags, 0o644)
+            except FileNotFoundError:
+                # Parent directory doesn't exist yet - create it (first save only)
+                state_dir = os.path.dirname(self.state_file)
+                os.makedirs(state_dir, exist_ok=True)
+                logger.info(f"Created state directory: {state_dir}")
+                fd = os.open(temp_file, flags, 0o644)
+            try:
                 # Acquire exclusive lock for writing (blocks all other access)
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                fcntl.flock(fd, fcntl.LOCK_EX)
                 try:
-                    json.dump(data, f, indent=2)
-                    f.flush()  # Ensure data is written to disk
-                    os.fsync(f.fileno())  # Force write to disk
+                    while buf:  # Loop only guards against rare short writes
+                        buf = buf[os.write(fd, buf):]
+                    _fdatasync(fd)  # Force data to disk before the rename
                 finally:
-                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
 
             # Atomic rename
             os.replace(temp_file, self.state_file)
 
-            logger.debug(f"Device state saved to {self.state_file} ({len(self.cached_devices)} cached devices)")
+            # Remember our own write so the next _load_state() doesn't re-parse it
+            self._state = state._replace(file_id=_file_id(os.stat(self.state_file)))
+
+            logger.debug("Device state saved to %s (%d cached devices)", self.state_file, len(state.cached_devices))
         except Exception as e:
             logger.error(f"Failed to save state file {self.state_file}: {e}", exc_info=True)
             # Don't re-raise - allow operation to continue with in-memory state only
 
-    def select_device(self, device_info: dict[str, Any]):
+    def _schedule_save(self):
+        """Mark state dirty and wake the background writer (caller must hold self.lock)."""
+        if self.save_delay <= 0 or self._closed:
+            self._save_state()
+            return
+
+        self._dirty.set()
+        if self._writer is None:
+            self._writer = Thread(target=self._writer_loop, name="device-state-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _writer_loop(self):
+        """Background writer - coalesces mutations made within save_delay into one write."""
+        while not self._closed:
+            self._dirty.wait()
+            if self._closed:
+                return
+            time.sleep(self.save_delay)
+            self.flush()
+
+    def close(self):
+        """Stop the background writer and write pending state changes to disk."""
+        with self.lock:
+            writer, self._writer = self._writer, None
+            self._closed = True
+            pending = self._dirty.is_set()
+            self._dirty.set()  # Wake the writer so it sees _closed and exits
+
+        if writer is not None:
+            writer.join()
+            atexit.unregister(self.close)
+
+        with self.lock:
+            if not pending:
+                self._dirty.clear()  # Only set to wake the writer - nothing to write
+        self.flush()
+
+    def flush(self):
+        """Write pending state changes to disk synchronously."""
+        with self.lock:
+            if self._dirty.is_set():
+                self._dirty.clear()
+                self._save_state()
+
+    def select_device(self, device_info: Mapping[str, Any]):
         """
         Select a device as the current active device.
 
         Args:
-            device_info: Device information dictionary
+            device_info: Device information dictionary (copied on ingress)
         """
+        frozen = _freeze(device_info)
         with self.lock:
-            self.current_device = device_info
-            self._save_state()
+            self._state = self._state._replace(current_device=frozen)
+            self._schedule_save()
             logger.info(f"Selected device: {device_info.get('friendly_name', 'Unknown')}")
 
-    def get_current_device(self) -> dict[str, Any] | None:
+    def get_current_device(self) -> DeviceInfo | None:
         """
         Get the currently selected device.
 
         Returns:
-            Device information dictionary or None if no device selected
+            Read-only device information or None if no device selected
         """
-        with self.lock:
-            # Always reload from disk to support multi-worker environments (Gunicorn)
-            # Each worker process has its own memory, so we must read from shared storage
-            self._load_state()
-            return self.current_device.copy() if self.current_device else None
+        # Reload from disk if changed to support multi-worker environments (Gunicorn)
+        # Each worker process has its own memory, so we must check shared storage
+        self._load_state()
+        return self._state.current_device
 
     def clear_device(self):
         """Clear the currently selected device."""
         with self.lock:
-            self.current_device = None
-            self._save_state()
+            self._state = self._state._replace(current_device=None)
+            self._schedule_save()
             logger.info("Cleared selected device")
 
     def has_device(self) -> bool:
         """Check if a device is currently selected."""
-        with self.lock:
-            return self.current_device is not None
+        return self._state.current_device is not None
 
-    def update_device_cache(self, devices: list[dict[str, Any]]):
+    def update_device_cache(self, devices: Iterable[Mapping[str, Any]]):
         """
         Update the cache of discovered devices.
 
         Args:
-            devices: List of device information dictionaries
+            devices: Device information dictionaries (copied on ingress)
         """
+        frozen = tuple(_freeze(d) for d in devices)
+        by_ip = _index_by_ip(frozen)
         with self.lock:
-            self.cached_devices = devices
-            self.last_scan_time = time.time()
-            try:
-                self._save_state()
-                logger.info(f"Device cache updated with {len(devices)} devices, saved to {self.state_file}")
-            except Exception as e:
-                logger.error(f"Failed to persist device cache to disk: {e}")
-                # Don't re-raise - cache is still updated in memory
+            self._state = self._state._replace(
+                cached_devices=frozen,
+                devices_by_ip=by_ip,
+                last_scan_time=time.time()
+            )
+            self._schedule_save()
+            logger.info(f"Device cache updated with {len(frozen)} devices")
 
-    def get_cached_devices(self) -> list[dict[str, Any]]:
+    def get_cached_devices(self) -> tuple[DeviceInfo, ...]:
         """
         Get cached devices.
 
         Returns:
-            List of cached device information
+            Tuple of read-only cached device information
         """
-        with self.lock:
-            # Always reload from disk to support multi-worker environments (Gunicorn)
-            self._load_state()
-            return self.cached_devices.copy()
+        # Reload from disk if changed to support multi-worker environments (Gunicorn)
+        self._load_state()
+        return self._state.cached_devices
 
     def get_cache_age(self) -> float | None:
         """
@@ -162,14 +355,14 @@ class DeviceManager:
         Returns:
             Age in seconds or None if never scanned
         """
-        with self.lock:
-            # Always reload from disk to support multi-worker environments (Gunicorn)
-            self._load_state()
-            if self.last_scan_time is None:
-                return None
-            return time.time() - self.last_scan_time
+        # Reload from disk if changed to support multi-worker environments (Gunicorn)
+        self._load_state()
+        last_scan_time = self._state.last_scan_time
+        if last_scan_time is None:
+            return None
+        return time.time() - last_scan_time
 
-    def find_device_in_cache(self, ip: str = None) -> dict[str, Any] | None:
+    def find_device_in_cache(self, ip: str = None) -> DeviceInfo | None:
         """
         Find device in cache by IP address.
 
@@ -177,12 +370,10 @@ class DeviceManager:
             ip: IP address to search for
 
         Returns:
-            Device info or None if not found
+            Read-only device info or None if not found
         """
-        with self.lock:
-            # Always reload from disk to support multi-worker environments (Gunicorn)
-            self._load_state()
-            for device in self.cached_devices:
-                if ip and device.get('ip') == ip:
-                    return device.copy()
+        # Reload from disk if changed to support multi-worker environments (Gunicorn)
+        self._load_state()
+        if not ip:
             return None
+        return self._state.devices_by_ip.get(ip)
@@ -1,14 +1,41 @@
 """SSDP/UPnP device discovery for finding DLNA devices on the network."""
 
 import logging
+import selectors
 import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from queue import SimpleQueue
 from urllib.parse import urlparse
-from xml.etree import ElementTree as ET
 
 from app.http_client import http_client
 
+try:
+    from lxml import etree as ET
+    # Descriptions come from arbitrary LAN hosts - never expand entities or fetch DTDs
+    _xml_parser = ET.XMLParser(resolve_entities=False, no_network=True)
+except ImportError:  # Optional - stdlib ElementTree is used when lxml is not installed
+    from xml.etree import ElementTree as ET
+    _xml_parser = None
+
+try:
+    import psutil
+except ImportError:  # Optional - M-SEARCH goes out the default interface only without psutil
+    psutil = None
+
 logger = logging.getLogger(__name__)
 
+# Candidate port/path combinations that don't accept a connection within this many seconds are skipped
+_PROBE_CONNECT_TIMEOUT = 2.0
+
+# Device descriptions are typically 1-8 KiB
+_MAX_DESCRIPTION_SIZE = 256 * 1024
+
+# Parsed device descriptions keyed by LOCATION: (device_info, ETag, Last-Modified)
+_DESCRIPTION_CACHE_SIZE = 64
+_description_cache: dict[str, tuple[dict[str, str], str | None, str | None]] = {}
+
 
 class SSDPDiscovery:
     """SSDP/UPnP discovery for DLNA MediaRenderer devices."""
@@ -20,127 +47,175 @@ class SSDPDiscovery:
     # Search for DLNA MediaRenderer devices
     SSDP_ST = "urn:schemas-upnp-org:device:MediaRenderer:1"
 
-    @staticmethod
-    def discover(timeout: int = 5, device_callback=None) -> list[dict[str, str]]:
+    # M-SEARCH request never changes - build it once
+    _MSEARCH_MSG = (
+        f'M-SEARCH * HTTP/1.1\r\n'
+        f'HOST: {SSDP_ADDR}:{SSDP_PORT}\r\n'
+        f'MAN: "ssdp:discover"\r\n'
+        f'MX: {SSDP_MX}\r\n'
+        f'ST: {SSDP_ST}\r\n'
+        f'\r\n'
+    ).encode('utf-8')
+
+    # Receive buffer for the response burst (kernel caps it at net.core.rmem_max)
+    SSDP_RCVBUF = 4 << 20
+
+    @classmethod
+    def discover(cls, timeout: int = 5, device_callback=None, rcvbuf: int = SSDP_RCVBUF) -> list[dict[str, str]]:
         """
         Discover DLNA MediaRenderer devices on the local network.
 
         Args:
             timeout: How long to wait for responses (seconds)
             device_callback: Optional callback(device_info) called for each found device
+            rcvbuf: Socket receive buffer size in bytes (0 = keep system default)
 
         Returns:
             List of discovered devices with their information
         """
         logger.info(f"Starting SSDP discovery (timeout: {timeout}s)")
 
-        # Build M-SEARCH request
-        msg = (
-            f'M-SEARCH * HTTP/1.1\r\n'
-            f'HOST: {SSDPDiscovery.SSDP_ADDR}:{SSDPDiscovery.SSDP_PORT}\r\n'
-            f'MAN: "ssdp:discover"\r\n'
-            f'MX: {SSDPDiscovery.SSDP_MX}\r\n'
-            f'ST: {SSDPDiscovery.SSDP_ST}\r\n'
-            f'\r\n'
-        )
-
         devices = []
         seen_locations = set()
+        seen_devices = set()  # Device UUIDs from USN - one device may answer with several LOCATIONs
 
         try:
             # Create UDP socket for multicast
             sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-            # Enable broadcasting - helps with multicast in Docker
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-
-            # Set multicast TTL (time-to-live)
-            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
-
-            # Join multicast group - CRITICAL for Docker environments
-            # This tells the kernel to accept packets sent to the multicast group
-            import struct
-            mreq = struct.pack('4sL', socket.inet_aton(SSDPDiscovery.SSDP_ADDR), socket.INADDR_ANY)
-            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
-
-            # Bind to SSDP multicast port to receive responses
-            sock.bind(('', SSDPDiscovery.SSDP_PORT))
-
-            sock.settimeout(timeout)
-
-            logger.debug(f"Socket bound to port {SSDPDiscovery.SSDP_PORT}, joined multicast group {SSDPDiscovery.SSDP_ADDR}")
-
-            # Send M-SEARCH request (send twice for reliability)
-            msg_encoded = msg.encode('utf-8')
-            for i in range(2):
-                sock.sendto(msg_encoded, (SSDPDiscovery.SSDP_ADDR, SSDPDiscovery.SSDP_PORT))
-                logger.debug(f"M-SEARCH request sent (attempt {i+1})")
-                if i == 0:
-                    import time
-                    time.sleep(0.1)  # Small delay between sends
-
-            # Collect responses - just gather locations first
-            response_count = 0
-            locations = []
-            while True:
-                try:
-                    data, addr = sock.recvfrom(65507)
-                    response = data.decode('utf-8', errors='ignore')
-                    response_count += 1
-
-                    logger.debug(f"Received response #{response_count} from {addr[0]}")
-
-                    # Parse response headers
-                    headers = SSDPDiscovery._parse_ssdp_response(response)
-                    location = headers.get('LOCATION')
-
-                    if location and location not in seen_locations:
-                        seen_locations.add(location)
-                        locations.append(location)
-                        logger.info(f"Found device at {location}")
-
-                except socket.timeout:
-                    # Expected - no more responses
-                    logger.debug(f"Discovery timeout reached. Received {response_count} total responses.")
-                    break
-                except Exception as e:
-                    logger.debug(f"Error receiving SSDP response: {e}")
-                    continue
-
-            sock.close()
+            try:
+                # Enlarge receive buffer so near-simultaneous responses aren't dropped
+                if rcvbuf:
+                    try:
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+                    except OSError as e:
+                        logger.debug(f"Could not set SO_RCVBUF to {rcvbuf}: {e}")
+                    actual = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+                    # Linux reports double the usable size to account for bookkeeping overhead
+                    if actual < rcvbuf:
+                        logger.debug(f"SO_RCVBUF is {actual} bytes (requested {rcvbuf}); raise net.core.rmem_max for more")
+
+                # Enable broadcasting - helps with multicast in Docker
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+                # Set multicast TTL (time-to-live)
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+
+                # Bind to an ephemeral port - M-SEARCH responses are unicast back to the sender's
+                # port, so there's no need to share 1900 (and its multicast NOTIFY traffic) with
+                # other SSDP clients on the host
+                sock.bind(('', 0))
+
+                sock.setblocking(False)
+
+                logger.debug(f"Socket bound to port {sock.getsockname()[1]}")
+
+                # Send M-SEARCH request. It is repeated once for reliability from within the
+                # receive loop, so responses to the first one are collected meanwhile.
+                interfaces = cls._multicast_interfaces()
+                cls._send_msearch(sock, interfaces)
+                logger.debug(f"M-SEARCH request sent on {len(interfaces)} interface(s) (attempt 1)")
+                resend_time = time.monotonic() + 0.1
+
+                # Collect responses - just gather locations first. Stop at the deadline, or
+                # earlier once no new device answered for longer than devices may delay (MX).
+                response_count = 0
+                locations = []
+                deadline = time.monotonic() + timeout
+                last_new_location_time = time.monotonic()
+                quiet_period = cls.SSDP_MX + 1
+                extract_ssdp_fields = cls._extract_ssdp_fields  # Bound once for the receive loop
+                with selectors.DefaultSelector() as selector:
+                    selector.register(sock, selectors.EVENT_READ)
+                    while True:
+                        now = time.monotonic()
+                        if resend_time is not None and now >= resend_time:
+                            cls._send_msearch(sock, interfaces)
+                            logger.debug(f"M-SEARCH request sent on {len(interfaces)} interface(s) (attempt 2)")
+                            resend_time = None
+
+                        wait = min(deadline, last_new_location_time + quiet_period) - now
+                        if wait <= 0:
+                            logger.debug(f"Discovery finished. Received {response_count} total responses.")
+                            break
+                        if resend_time is not None:
+                            wait = min(wait, resend_time - now)
+                        if not selector.select(wait):
+                            continue
+
+                        # Drain every queued datagram before selecting again
+                        while True:
+                            try:
+                                data, addr = sock.recvfrom(65507)
+                            except BlockingIOError:
+                                break
+                            except Exception as e:
+                                logger.debug(f"Error receiving SSDP response: {e}")
+                                break
+
+                            response_count += 1
+
+                            logger.debug(f"Received response #{response_count} from {addr[0]}")
+
+                            # Extract the only headers we need
+                            location, usn = extract_ssdp_fields(data)
+                            # USN is "uuid:<device>::<type>"; the uuid part identifies the device
+                            device_uuid = usn.partition('::')[0] if usn else ''
+
+                            if location and location not in seen_locations and device_uuid not in seen_devices:
+                                seen_locations.add(location)
+                                if device_uuid:
+                                    seen_devices.add(device_uuid)
+                                locations.append(location)
+                                last_new_location_time = time.monotonic()
+                                logger.info(f"Found device at {location}")
+            finally:
+                sock.close()
 
             # Fetch device descriptions in parallel
             if locations:
-                from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
                 logger.debug(f"Fetching device info for {len(locations)} locations in parallel")
 
-                with ThreadPoolExecutor(max_workers=min(10, len(locations))) as executor:
-                    future_to_location = {
-                        executor.submit(SSDPDiscovery._fetch_device_info, loc): loc
-                        for loc in locations
-                    }
-
-                    # Wait for all futures with a timeout (max 15s for all parallel fetches)
-                    for future in as_completed(future_to_location, timeout=15):
-                        location = future_to_location[future]
-                        try:
-                            device_info = future.result(timeout=1)  # Individual result timeout
-                            if device_info:
-                                devices.append(device_info)
-                                logger.info(f"Discovered device: {device_info.get('friendly_name', 'Unknown')}")
-                                # Call callback immediately when device is found
-                                if device_callback:
-                                    try:
-                                        device_callback(device_info)
-                                    except Exception as e:
-                                        logger.error(f"Device callback failed: {e}")
-                            else:
-                                logger.warning(f"Device at {location} returned no info (filtered out or failed parsing)")
-                        except TimeoutError:
-                            logger.warning(f"Timeout fetching device info from {location}")
-                        except Exception as e:
-                            logger.warning(f"Failed to fetch device info from {location}: {e}")
+                # Hand devices to the callback on its own thread so slow callback code
+                # doesn't hold up collecting the remaining fetch results
+                callback_queue = None
+                callback_thread = None
+                if device_callback:
+                    callback_queue = SimpleQueue()
+                    callback_thread = threading.Thread(
+                        target=cls._drain_callbacks,
+                        args=(callback_queue, device_callback),
+                        name="ssdp-device-callback",
+                        daemon=True
+                    )
+                    callback_thread.start()
+
+                try:
+                    with ThreadPoolExecutor(max_workers=min(10, len(locations))) as executor:
+                        future_to_location = {
+                            executor.submit(cls._fetch_device_info, loc): loc
+                            for loc in locations
+                        }
+
+                        # Wait for all futures with a timeout (max 15s for all parallel fetches)
+                        for future in as_completed(future_to_location, timeout=15):
+                            location = future_to_location[future]
+                            try:
+                                device_info = future.result(timeout=1)  # Individual result timeout
+                                if device_info:
+                                    devices.append(device_info)
+                                    logger.info(f"Discovered device: {device_info.get('friendly_name', 'Unknown')}")
+                                    if callback_queue is not None:
+                                        callback_queue.put(device_info)
+                                else:
+                                    logger.warning(f"Device at {location} returned no info (filtered out or failed parsing)")
+                            except TimeoutError:
+                                logger.warning(f"Timeout fetching device info from {location}")
+                            except Exception as e:
+                                logger.warning(f"Failed to fetch device info from {location}: {e}")
+                finally:
+                    if callback_thread:
+                        callback_queue.put(None)  # Sentinel - no more devices
+                        callback_thread.join()  # Callers expect all callbacks done on return
 
         except Exception as e:
             logger.error(f"SSDP discovery failed: {e}", exc_info=True)
@@ -149,11 +224,58 @@ class SSDPDiscovery:
         return devices
 
     @staticmethod
-    def try_direct_connection(host: str, timeout: int = 5) -> dict[str, str] | None:
+    def _multicast_interfaces() -> list[str | None]:
+        """
+        List local IPv4 addresses to send M-SEARCH from.
+
+        Returns:
+            Interface addresses (loopback and link-local skipped), or [None] for the
+            default multicast interface when psutil is unavailable or finds none
+        """
+        if psutil is None:
+            return [None]
+
+        addresses = []
+        try:
+            for addrs in psutil.net_if_addrs().values():
+                for addr in addrs:
+                    if addr.family == socket.AF_INET and not addr.address.startswith(('127.', '169.254.')):
+                        addresses.append(addr.address)
+        except Exception as e:
+            logger.debug(f"Could not enumerate network interfaces: {e}")
+        return addresses or [None]
+
+    @classmethod
+    def _send_msearch(cls, sock: socket.socket, interfaces: list[str | None]):
+        """Send M-SEARCH out of each interface; replies come back unicast to the bound socket."""
+        msg, target = cls._MSEARCH_MSG, (cls.SSDP_ADDR, cls.SSDP_PORT)
+        for address in interfaces:
+            try:
+                if address is not None:
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(address))
+                sock.sendto(msg, target)
+            except OSError as e:
+                logger.debug(f"Failed to send M-SEARCH via {address or 'default interface'}: {e}")
+
+    @staticmethod
+    def _drain_callbacks(callback_queue: SimpleQueue, device_callback):
+        """Deliver discovered devices to device_callback until the None sentinel arrives."""
+        while (device_info := callback_queue.get()) is not None:
+            try:
+                device_callback(device_info)
+            except Exception as e:
+                logger.error(f"Device callback failed: {e}")
+
+    @classmethod
+    def try_direct_connection(cls, host: str, timeout: int = 5) -> dict[str, str] | None:
         """
         Try to connect directly to a device by IP/hostname.
         Attempts common device description XML paths.
 
+        Returns as soon as one candidate serves a description. Probes already in flight
+        then finish in the background (within ``timeout``), still holding their
+        HTTP client bulkhead slots; queued probes are cancelled.
+
         Args:
             host: IP address or hostname
             timeout: Timeout for each attempt (default: 5s)
@@ -175,38 +297,73 @@ class SSDPDiscovery:
 
         logger.info(f"Attempting direct connection to {host}")
 
-        for port in common_ports:
-            for path in common_paths:
-                location = f"http://{host}:{port}{path}"
-                try:
-                    response = http_client.get(location, timeout=timeout)
-                    if response.status_code == 200 and 'xml' in response.headers.get('Content-Type', '').lower():
-                        logger.info(f"Found device at {location}")
-                        device_info = SSDPDiscovery._fetch_device_info(location)
-                        if device_info:
-                            return device_info
-                except Exception as e:
-                    logger.debug(f"Failed to connect to {location}: {e}")
-                    continue
+        # Probe all port/path combinations in parallel and take the first device found
+        locations = [f"http://{host}:{port}{path}" for port in common_ports for path in common_paths]
+        executor = ThreadPoolExecutor(max_workers=16)
+        try:
+            futures = [executor.submit(cls._probe_location, loc, timeout) for loc in locations]
+            for future in as_completed(futures):
+                device_info = future.result()
+                if device_info:
+                    return device_info
+        finally:
+            # Don't wait for probes still in flight once we have an answer - at most
+            # max_workers of them, each bounded by timeout and off the circuit breaker
+            executor.shutdown(wait=False, cancel_futures=True)
 
         logger.warning(f"Could not connect to device at {host}")
         return None
 
-    @staticmethod
-    def _parse_ssdp_response(response: str) -> dict[str, str]:
-        """Parse SSDP response headers."""
-        headers = {}
-        lines = response.split('\r\n')
+    @classmethod
+    def _probe_location(cls, location: str, timeout: int) -> dict[str, str] | None:
+        """
+        Check a candidate description URL with HEAD and fetch device info if it serves XML.
 
-        for line in lines[1:]:  # Skip first line (HTTP status)
-            if ':' in line:
-                key, value = line.split(':', 1)
-                headers[key.strip().upper()] = value.strip()
+        Probes don't use the circuit breaker (no fail_fast): a burst of them against one
+        offline host must not block the requests that follow a successful probe.
+        """
+        probe_timeout = (min(timeout, _PROBE_CONNECT_TIMEOUT), timeout)
+        try:
+            response = http_client.head(location, timeout=probe_timeout, allow_redirects=True)
+            if response.status_code in (405, 501):
+                # HEAD not supported by this device - GET instead and parse that body,
+                # read with the same size cap, rather than downloading it a second time
+                with http_client.get(location, timeout=probe_timeout, stream=True) as response:
+                    if cls._is_xml_response(response):
+                        logger.info(f"Found device at {location}")
+                        return cls._device_info_from_response(location, response)
+                return None
+            if cls._is_xml_response(response):
+                logger.info(f"Found device at {location}")
+                return cls._fetch_device_info(location)
+        except Exception as e:
+            logger.debug(f"Failed to connect to {location}: {e}")
+        return None
 
-        return headers
+    @staticmethod
+    def _is_xml_response(response) -> bool:
+        """Check for a successful response that declares an XML body or no Content-Type (body is sniffed later)."""
+        content_type = response.headers.get('Content-Type', '').lower()
+        return response.status_code == 200 and (not content_type or 'xml' in content_type)
 
     @staticmethod
-    def _fetch_device_info(location: str) -> dict[str, str] | None:
+    def _extract_ssdp_fields(data: bytes) -> tuple[str | None, str | None]:
+        """Extract LOCATION and USN headers from a raw SSDP response in a single scan."""
+        location = usn = None
+        for line in data.split(b'\r\n')[1:]:  # Skip first line (HTTP status)
+            name = line[:9].upper()
+            if name == b'LOCATION:':
+                location = line[9:].strip().decode('utf-8', errors='ignore')
+            elif name[:4] == b'USN:':
+                usn = line[4:].strip().decode('utf-8', errors='ignore')
+            else:
+                continue
+            if location and usn:
+                break
+        return location, usn
+
+    @classmethod
+    def _fetch_device_info(cls, location: str) -> dict[str, str] | None:
         """
         Fetch device description XML and extract relevant information.
 
@@ -216,70 +373,115 @@ class SSDPDiscovery:
         Returns:
             Dictionary with device information or None if failed
         """
+        cached = _description_cache.get(location)
+        headers = {}
+        if cached:
+            _, etag, last_modified = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
         try:
-            response = http_client.get(location, timeout=5)
-            if response.status_code != 200:
-                logger.warning(f"Failed to fetch device description from {location}")
+            with http_client.get(location, timeout=5, headers=headers, fail_fast=True, stream=True) as response:
+                if response.status_code == 304 and cached:
+                    logger.debug(f"Device description at {location} not modified, using cached info")
+                    return dict(cached[0])
+                if response.status_code != 200:
+                    logger.warning(f"Failed to fetch device description from {location}")
+                    return None
+                return cls._device_info_from_response(location, response)
+        except Exception as e:
+            logger.error(f"Error fetching device info from {location}: {e}")
+            return None
+
+    @classmethod
+    def _device_info_from_response(cls, location: str, response) -> dict[str, str] | None:
+        """
+        Read a streamed 200 description response, parse it and update the description cache.
+
+        Args:
+            location: URL the description was fetched from
+            response: Streamed response (stream=True), body not yet read
+
+        Returns:
+            Dictionary with device information or None if not a usable description
+        """
+        # Skip obvious non-XML replies (captive portals, HTML error pages) before downloading
+        content_type = response.headers.get('Content-Type', '').lower()
+        if content_type and 'xml' not in content_type:
+            logger.debug(f"Device description at {location} has non-XML Content-Type: {content_type}")
+            return None
+
+        # Read at most _MAX_DESCRIPTION_SIZE so a misbehaving device can't exhaust memory
+        content = bytearray()
+        for chunk in response.iter_content(chunk_size=8192):
+            content += chunk
+            if len(content) > _MAX_DESCRIPTION_SIZE:
+                logger.warning(f"Device description at {location} exceeds {_MAX_DESCRIPTION_SIZE} bytes, skipping")
                 return None
 
-            # Parse XML
-            root = ET.fromstring(response.content)
+        # Some devices omit Content-Type - sniff the body before handing it to the parser
+        if not content.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'<'):
+            logger.debug(f"Device description at {location} is not XML, skipping")
+            return None
 
-            # Define namespaces
-            ns = {'upnp': 'urn:schemas-upnp-org:device-1-0'}
+        device_info = cls._parse_device_description(location, bytes(content))
 
-            # Extract device information
-            device = root.find('.//upnp:device', ns)
-            if device is None:
-                # Try without namespace
-                device = root.find('.//device')
+        # Only cache descriptions the device lets us revalidate, so stale info is never served
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if device_info and (etag or last_modified):
+            if location not in _description_cache and len(_description_cache) >= _DESCRIPTION_CACHE_SIZE:
+                _description_cache.pop(next(iter(_description_cache)), None)  # Evict oldest entry
+            _description_cache[location] = (dict(device_info), etag, last_modified)
+        elif location in _description_cache:
+            _description_cache.pop(location, None)
 
+        return device_info
+
+    @classmethod
+    def _parse_device_description(cls, location: str, content: bytes) -> dict[str, str] | None:
+        """
+        Parse device description XML into device information.
+
+        Args:
+            location: URL the description was fetched from
+            content: Raw description XML
+
+        Returns:
+            Dictionary with device information or None if not a MediaRenderer
+        """
+        try:
+            root = ET.fromstring(content, _xml_parser)
+
+            # Extract device information ({*} matches the UPnP namespace or none at all)
+            device = root.find('.//{*}device')
             if device is None:
                 logger.warning(f"Could not find device element in {location}")
                 return None
 
-            def get_text(element, tag, namespaces=None):
-                """Helper to safely extract text from XML element."""
-                if namespaces:
-                    elem = element.find(f'.//{namespaces[0]}:{tag}', {namespaces[0]: namespaces[1]})
-                else:
-                    elem = element.find(f'.//{tag}')
-                return elem.text if elem is not None else ''
-
             # Extract basic info
-            friendly_name = get_text(device, 'friendlyName', ('upnp', ns['upnp'])) or get_text(device, 'friendlyName')
-            manufacturer = get_text(device, 'manufacturer', ('upnp', ns['upnp'])) or get_text(device, 'manufacturer')
-            model_name = get_text(device, 'modelName', ('upnp', ns['upnp'])) or get_text(device, 'modelName')
-            udn = get_text(device, 'UDN', ('upnp', ns['upnp'])) or get_text(device, 'UDN')
+            friendly_name = device.findtext('.//{*}friendlyName') or ''
+            manufacturer = device.findtext('.//{*}manufacturer') or ''
+            model_name = device.findtext('.//{*}modelName') or ''
+            udn = device.findtext('.//{*}UDN') or ''
 
             # Extract host from location URL
             parsed_url = urlparse(location)
             host = parsed_url.hostname or ''
             port = parsed_url.port or 80
 
-            # Find AVTransport service control URL
-            control_url = SSDPDiscovery._find_av_transport_control_url(device, ns, parsed_url.scheme, host, port)
+            # Find AVTransport and ConnectionManager (for GetProtocolInfo) control URLs
+            control_url, connection_manager_url = cls._find_service_control_urls(
+                device, parsed_url.scheme, host, port
+            )
 
             # Filter out devices without AVTransport (MediaServers, not MediaRenderers)
             # Only keep devices that can actually play media
-            if not control_url or control_url.endswith('/AVTransport/ctrl'):
-                # If control_url is the fallback default, verify AVTransport actually exists
-                services = device.findall('.//upnp:service', ns) or device.findall('.//service')
-                has_av_transport = False
-                for service in services:
-                    service_type = service.find('.//upnp:serviceType', ns)
-                    if service_type is None:
-                        service_type = service.find('.//serviceType')
-                    if service_type is not None and 'AVTransport' in service_type.text:
-                        has_av_transport = True
-                        break
-
-                if not has_av_transport:
-                    logger.debug(f"Skipping device {friendly_name} - no AVTransport service (likely MediaServer)")
-                    return None
-
-            # Find ConnectionManager service control URL (for GetProtocolInfo)
-            connection_manager_url = SSDPDiscovery._find_connection_manager_control_url(device, ns, parsed_url.scheme, host, port)
+            if control_url is None:
+                logger.debug(f"Skipping device {friendly_name} - no AVTransport service (likely MediaServer)")
+                return None
 
             device_id = udn.replace('uuid:', '') if udn else None
 
@@ -297,79 +499,46 @@ class SSDPDiscovery:
             }
 
         except Exception as e:
-            logger.error(f"Error fetching device info from {location}: {e}")
+            logger.error(f"Error parsing device description from {location}: {e}")
             return None
 
-    @staticmethod
-    def _find_av_transport_control_url(device, ns, scheme, host, port) -> str | None:
-        """Find AVTransport service control URL."""
-        try:
-            # Look for AVTransport service
-            services = device.findall('.//upnp:service', ns)
-            if not services:
-                services = device.findall('.//service')
-
-            for service in services:
-                service_type = service.find('.//upnp:serviceType', ns)
-                if service_type is None:
-                    service_type = service.find('.//serviceType')
-
-                if service_type is not None and 'AVTransport' in service_type.text:
-                    control_url_elem = service.find('.//upnp:controlURL', ns)
-                    if control_url_elem is None:
-                        control_url_elem = service.find('.//controlURL')
-
-                    if control_url_elem is not None:
-                        control_path = control_url_elem.text
-                        # Build full URL
-                        if control_path.startswith('http'):
-                            return control_path
-                        else:
-                            # Relative path - build full URL
-                            if not control_path.startswith('/'):
-                                control_path = '/' + control_path
-                            return f"{scheme}://{host}:{port}{control_path}"
-
-            # Fallback to common default
-            return f"{scheme}://{host}:{port}/AVTransport/ctrl"
+    @classmethod
+    def _find_service_control_urls(cls, device, scheme, host, port) -> tuple[str | None, str]:
+        """
+        Find AVTransport and ConnectionManager control URLs in one pass over the services.
 
-        except Exception as e:
-            logger.debug(f"Error finding AVTransport control URL: {e}")
-            return f"{scheme}://{host}:{port}/AVTransport/ctrl"
+        Returns:
+            (AVTransport URL or None if the device has no AVTransport service,
+             ConnectionManager URL falling back to the common default)
+        """
+        base_url = f"{scheme}://{host}:{port}"
+        av_transport_url = None
+        connection_manager_url = None
+
+        for service in device.iterfind('.//{*}service'):
+            service_type = service.findtext('{*}serviceType') or ''
+            if av_transport_url is None and 'AVTransport' in service_type:
+                av_transport_url = cls._absolute_control_url(
+                    service.findtext('{*}controlURL'), base_url, '/AVTransport/ctrl'
+                )
+            elif connection_manager_url is None and 'ConnectionManager' in service_type:
+                connection_manager_url = cls._absolute_control_url(
+                    service.findtext('{*}controlURL'), base_url, '/ConnectionManager/ctrl'
+                )
+            if av_transport_url and connection_manager_url:
+                break
+
+        return av_transport_url, connection_manager_url or f"{base_url}/ConnectionManager/ctrl"
 
     @staticmethod
-    def _find_connection_manager_control_url(device, ns, scheme, host, port) -> str | None:
-        """Find ConnectionManager service control URL."""
-        try:
-            # Look for ConnectionManager service
-            services = device.findall('.//upnp:service', ns)
-            if not services:
-                services = device.findall('.//service')
-
-            for service in services:
-                service_type = service.find('.//upnp:serviceType', ns)
-                if service_type is None:
-                    service_type = service.find('.//serviceType')
-
-                if service_type is not None and 'ConnectionManager' in service_type.text:
-                    control_url_elem = service.find('.//upnp:controlURL', ns)
-                    if control_url_elem is None:
-                        control_url_elem = service.find('.//controlURL')
-
-                    if control_url_elem is not None:
-                        control_path = control_url_elem.text
-                        # Build full URL
-                        if control_path.startswith('http'):
-                            return control_path
-                        else:
-                            # Relative path - build full URL
-                            if not control_path.startswith('/'):
-                                control_path = '/' + control_path
-                            return f"{scheme}://{host}:{port}{control_path}"
-
-            # Fallback to common default
-            return f"{scheme}://{host}:{port}/ConnectionManager/ctrl"
-
-        except Exception as e:
-            logger.debug(f"Error finding ConnectionManager control URL: {e}")
-            return f"{scheme}://{host}:{port}/ConnectionManager/ctrl"
+    def _absolute_control_url(control_path: str | None, base_url: str, default_path: str) -> str:
+        """Build full control URL from a (possibly relative) controlURL, using default_path if missing."""
+        control_path = (control_path or '').strip()
+        if not control_path:
+            return f"{base_url}{default_path}"
+        if control_path.startswith('http'):
+            return control_path
+        # Relative path - build full URL
+        if not control_path.startswith('/'):
+            control_path = '/' + control_path
+        return f"{base_url}{control_path}"
@@ -1,106 +1,397 @@
 """DLNA/UPnP client for controlling media renderers."""
 
+import json
 import logging
+import os
+import random
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from threading import Lock
 from typing import Any
-from xml.etree import ElementTree as ET
+
+from requests import Response
 
 from app.http_client import http_client
 
+try:
+    from lxml import etree as ET
+    _HAVE_LXML = True
+except ImportError:  # Optional - stdlib ElementTree is used when lxml is not installed
+    from xml.etree import ElementTree as ET
+    _HAVE_LXML = False
+
 logger = logging.getLogger(__name__)
 
+_SOAP_ENVELOPE_HEAD = b'''<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"
+            s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
+    <s:Body>
+'''
+
+_AV_TRANSPORT_ACTIONS = ('SetAVTransportURI', 'Play', 'Stop', 'Pause', 'GetTransportInfo')
+
+
+def _build_soap_headers(action: str) -> dict[str, str]:
+    """Build the HTTP headers for an AVTransport SOAP action."""
+    return {
+        'Content-Type': 'text/xml; charset="utf-8"',
+        'SOAPAction': f'"urn:schemas-upnp-org:service:AVTransport:1#{action}"',
+        # Keep the socket open so the shared http_client pool reuses it for the next
+        # action (e.g. GetTransportInfo polling) instead of reconnecting every time
+        'Connection': 'keep-alive',
+    }
+
+
+@lru_cache(maxsize=None)
+def _envelope_parts(action: str, instance_id: str) -> tuple[bytes, bytes]:
+    """
+    Encoded SOAP envelope for an AVTransport action, split around the arguments.
+
+    Returns:
+        (prefix up to and including the InstanceID line, suffix closing the envelope)
+    """
+    prefix = (
+        _SOAP_ENVELOPE_HEAD
+        + f'        <u:{action} xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">\n'
+          f'            <InstanceID>{instance_id}</InstanceID>\n'.encode('utf-8')
+    )
+    suffix = f'        </u:{action}>\n    </s:Body>\n</s:Envelope>'.encode('utf-8')
+    return prefix, suffix
+
+
+@lru_cache(maxsize=None)
+def _argless_envelope(action: str, instance_id: str) -> bytes:
+    """Complete encoded envelope for an action without arguments (Stop, Pause, GetTransportInfo)."""
+    return b''.join(_envelope_parts(action, instance_id))
+
+
+# Single-pass XML escaping for text and attribute values
+_XML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&apos;'})
+_XML_SPECIAL_RE = re.compile(r'[&<>"\']')
+
+
+def _xml_escape(value: str) -> str:
+    """XML-escape a text value in one pass; values without special characters are returned as-is."""
+    if _XML_SPECIAL_RE.search(value) is None:
+        return value
+    return value.translate(_XML_ESCAPE)
+
+
+# Headers are fixed per action - build them once at import.
+# Header dicts are shared, not copied: requests merges them without mutating.
+_SOAP_HEADERS = {action: _build_soap_headers(action) for action in _AV_TRANSPORT_ACTIONS}
+
+# Complete (envelope, headers) for the argument-free actions on the default instance -
+# transport polling sends these constantly, so there is nothing left to build per call
+_DEFAULT_INSTANCE_ID = "0"
+_ARGLESS_REQUESTS = {
+    (action, _DEFAULT_INSTANCE_ID): (_argless_envelope(action, _DEFAULT_INSTANCE_ID), _SOAP_HEADERS[action])
+    for action in ('Stop', 'Pause', 'GetTransportInfo')
+}
+_PROTOCOL_INFO_HEADERS = {
+    'Content-Type': 'text/xml; charset="utf-8"',
+    'SOAPAction': '"urn:schemas-upnp-org:service:ConnectionManager:1#GetProtocolInfo"',
+    'Connection': 'keep-alive',
+}
+
+# Detected capabilities shared across client instances: device key -> (detected at (epoch), capabilities).
+# Devices are keyed by UDN, so a different renderer taking over an IP (e.g. after a DHCP change)
+# isn't given the old one's capabilities; clients without a UDN fall back to "host:port".
+_CAPABILITIES_TTL = 3600  # Protocol info rarely changes; re-detect hourly
+_capabilities_cache: dict[str, tuple[float, dict[str, Any]]] = {}
+_capabilities_lock = Lock()
+_capabilities_file: str | None = None  # Detections are persisted here once set (see load_capabilities_cache)
+
+
+def _save_capabilities_cache():
+    """Write the capabilities cache to disk atomically (caller must hold _capabilities_lock)."""
+    if not _capabilities_file:
+        return
+
+    data = {
+        key: {'detected_at': detected_at, 'capabilities': capabilities}
+        for key, (detected_at, capabilities) in _capabilities_cache.items()
+    }
+    temp_file = f"{_capabilities_file}.tmp"
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_file, _capabilities_file)
+    except OSError as e:
+        logger.warning(f"Failed to save capabilities cache {_capabilities_file}: {e}")
+
+
+# GetTransportInfo values read with precompiled patterns before falling back to XML parsing
+_STATE_RE = re.compile(r'<CurrentTransportState>([^<]+)</CurrentTransportState>')
+_STATUS_RE = re.compile(r'<CurrentTransportStatus>([^<]+)</CurrentTransportStatus>')
+_TRANSPORT_INFO_ELEMENTS = ('CurrentTransportState', 'CurrentTransportStatus')
+
+
+# Audio content formats in a protocol info list and the capability flag each one sets
+_PROTOCOL_FORMAT_RE = re.compile(r'audio/(mpeg|mp3|aac|x-aac|mp4|flac|x-flac|wav|x-wav|ogg|x-ogg)', re.IGNORECASE)
+_FORMAT_TO_FLAG = {
+    'mpeg': 'supports_mp3', 'mp3': 'supports_mp3',
+    'aac': 'supports_aac', 'x-aac': 'supports_aac', 'mp4': 'supports_aac',
+    'flac': 'supports_flac', 'x-flac': 'supports_flac',
+    'wav': 'supports_wav', 'x-wav': 'supports_wav',
+    'ogg': 'supports_ogg', 'x-ogg': 'supports_ogg',
+}
+_FORMAT_FLAG_COUNT = len(set(_FORMAT_TO_FLAG.values()))
+
+# Capability flag for common stream MIME types (exact match fast path for can_play_format)
+_MIME_TO_FLAG = {
+    'audio/mpeg': 'supports_mp3', 'audio/mp3': 'supports_mp3',
+    'audio/aac': 'supports_aac', 'audio/aacp': 'supports_aac', 'audio/mp4': 'supports_aac',
+    'audio/flac': 'supports_flac', 'audio/x-flac': 'supports_flac',
+    'audio/wav': 'supports_wav', 'audio/x-wav': 'supports_wav',
+    'audio/ogg': 'supports_ogg',
+}
+
+
+_PULL_CHUNK_SIZE = 4096  # Bytes fed to the pull parser between checks for the wanted elements
+
+
+def _find_elements_text(text: str, local_names: tuple[str, ...]) -> dict[str, str | None]:
+    """
+    Incrementally parse a SOAP response and return the text of the first element
+    with each of the given local names (any namespace).
+
+    The body is fed to a pull parser in chunks and parsing stops as soon as all
+    names were seen. Names that never appear are missing from the result.
+    """
+    wanted = set(local_names)
+    found: dict[str, str | None] = {}
+    # Responses are decoded text re-encoded as UTF-8, so override any declared encoding.
+    # Renderers are untrusted LAN hosts - never expand entities or fetch DTDs with lxml;
+    # the stdlib pull parser takes no parser options.
+    options = {'encoding': 'utf-8', 'resolve_entities': False, 'no_network': True} if _HAVE_LXML else {}
+    parser = ET.XMLPullParser(events=('end',), **options)
+    data = text.encode('utf-8')
+    for offset in range(0, len(data), _PULL_CHUNK_SIZE):
+        parser.feed(data[offset:offset + _PULL_CHUNK_SIZE])
+        for _, elem in parser.read_events():
+            tag = elem.tag
+            if isinstance(tag, str):
+                local_name = tag.rpartition('}')[2]
+                if local_name in wanted:
+                    wanted.discard(local_name)
+                    found[local_name] = elem.text
+                    if not wanted:
+                        return found
+    parser.close()  # Raises ParseError on truncated/malformed documents
+    return found
+
+
+# Largest SOAP response read from a renderer; anything bigger is dropped unparsed
+_MAX_SOAP_RESPONSE_SIZE = 64 * 1024
+# GetProtocolInfo Sink lists of feature-rich renderers run to tens of KB
+_MAX_PROTOCOL_INFO_SIZE = 256 * 1024
+
+
+def _read_body(response: Response, limit: int = _MAX_SOAP_RESPONSE_SIZE) -> str | None:
+    """
+    Read a streamed response body of at most ``limit`` bytes and decode it.
+
+    Returns:
+        The body text, or None if the body is larger than ``limit``
+    """
+    content = bytearray()
+    try:
+        for chunk in response.iter_content(chunk_size=8192):
+            content += chunk
+            if len(content) > limit:
+                logger.warning(f"Response from {response.url} exceeds {limit} bytes, ignoring it")
+                return None
+    finally:
+        response.close()  # Returns the connection to the pool, or drops it if we stopped early
+    return content.decode(response.encoding or 'utf-8', errors='replace')
+
+
+def _is_connection_refused(exc: BaseException) -> bool:
+    """Check whether a (possibly wrapped) requests/urllib3 error was caused by a refused connection."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, ConnectionRefusedError):
+            return True
+        seen.add(id(exc))
+        # requests wraps urllib3's MaxRetryError, whose reason wraps the socket error
+        nested = getattr(exc, 'reason', None) or exc.__cause__ or exc.__context__
+        if nested is None and exc.args and isinstance(exc.args[0], BaseException):
+            nested = exc.args[0]
+        exc = nested if isinstance(nested, BaseException) else None
+    return False
+
+
+def _find_element_text(text: str, local_name: str) -> str | None:
+    """Return the text of the first element with the given local name (any namespace), or None."""
+    return _find_elements_text(text, (local_name,)).get(local_name)
+
+
+# DLNA profile info advertised in DIDL-Lite metadata per stream MIME type
+_DLNA_PROFILES = {
+    'audio/mpeg': 'DLNA.ORG_PN=MP3;DLNA.ORG_OP=00;DLNA.ORG_CI=0;DLNA.ORG_FLAGS=8D100000000000000000000000000000',
+    'audio/mp3':  'DLNA.ORG_PN=MP3;DLNA.ORG_OP=00;DLNA.ORG_CI=0;DLNA.ORG_FLAGS=8D100000000000000000000000000000',
+    'audio/flac': 'DLNA.ORG_PN=FLAC;DLNA.ORG_OP=00;DLNA.ORG_CI=0;DLNA.ORG_FLAGS=8D100000000000000000000000000000',
+}
+
+
+@lru_cache(maxsize=32)
+def _didl_template(mime_type: str) -> tuple[str, str]:
+    """
+    DIDL-Lite metadata for a stream MIME type, split around the (escaped) resource URI.
+
+    Returns:
+        (document up to the res element's text, rest of the document)
+    """
+    protocol_info = _xml_escape(f'http-get:*:{mime_type}:{_DLNA_PROFILES.get(mime_type, "*")}')
+    head = (
+        '<DIDL-Lite xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/">'
+        '<item id="1" parentID="0" restricted="1">'
+        '<dc:title>Radio Stream</dc:title>'
+        '<upnp:class>object.item.audioItem.audioBroadcast</upnp:class>'
+        f'<res protocolInfo="{protocol_info}">'
+    )
+    return head, '</res></item></DIDL-Lite>'
+
+
+# Fallback substring checks for MIME types missing from _MIME_TO_FLAG, in priority order.
+# Common AAC MIME types: audio/aac, audio/aacp, audio/mp4, audio/vnd.dlna.adts, audio/x-hx-aac-adts
+_MIME_DISPATCH = (
+    ('mpeg', 'supports_mp3'), ('mp3', 'supports_mp3'),
+    ('aac', 'supports_aac'), ('mp4', 'supports_aac'), ('adts', 'supports_aac'), ('m4a', 'supports_aac'),
+    ('flac', 'supports_flac'),
+    ('wav', 'supports_wav'),
+    ('ogg', 'supports_ogg'),
+)
+
+
+@lru_cache(maxsize=64)
+def _capability_flag_for_mime(mime_lower: str) -> str | None:
+    """Map a lowercased MIME type to the capability flag that decides if it can be played."""
+    flag = _MIME_TO_FLAG.get(mime_lower)
+    if flag:
+        return flag
+
+    # First substring match wins, so order matters (e.g. audio/mpeg4 is checked as MP3)
+    for needle, flag in _MIME_DISPATCH:
+        if needle in mime_lower:
+            return flag
+    return None
+
+
+@lru_cache(maxsize=32)
+def _parse_protocol_info(protocol_info: str) -> frozenset[str]:
+    """Return the capability flags supported by a GetProtocolInfo Sink list."""
+    # Format is comma-separated list of protocol:network:contentFormat:additionalInfo
+    # e.g., http-get:*:audio/mpeg:* - one regex sweep finds every audio format
+    flags = set()
+    for m in _PROTOCOL_FORMAT_RE.finditer(protocol_info):
+        flags.add(_FORMAT_TO_FLAG[m.group(1).lower()])
+        if len(flags) == _FORMAT_FLAG_COUNT:
+            break  # Every format is supported - no need to scan the rest of a long Sink list
+    return frozenset(flags)
+
 
 class DLNAClient:
     """Simple DLNA/UPnP AVTransport client."""
 
     def __init__(self, device_host: str, device_port: int = 55000, protocol: str = "http",
-                 control_url: str | None = None, connection_manager_url: str | None = None):
+                 control_url: str | None = None, connection_manager_url: str | None = None,
+                 udn: str | None = None):
         self.device_host = device_host
         self.device_port = device_port
+        self.udn = udn
         self.protocol = protocol
         self.control_url = control_url or f"{protocol}://{device_host}:{device_port}/AVTransport/ctrl"
         self.connection_manager_url = connection_manager_url or f"{protocol}://{device_host}:{device_port}/ConnectionManager/ctrl"
-        self.instance_id = "0"
+        self.instance_id = _DEFAULT_INSTANCE_ID
         self.capabilities: dict[str, Any] | None = None
+        # GetTransportInfo call in progress; concurrent callers wait for it instead of sending their own
+        self._transport_info_inflight: Future | None = None
+        self._transport_info_lock = Lock()
 
-    def _send_soap_request(self, action: str, arguments: dict = None, timeout: int = 10) -> str | None:
-        """Send SOAP request to DLNA device.
+    def _post_soap(self, action: str, arguments: dict = None, timeout: float = 10) -> Response:
+        """Send SOAP request to DLNA device and return the HTTP response, whatever its status.
+
+        The body is not read yet; callers read it with _read_body().
 
         Args:
             action: SOAP action name
-            arguments: Action arguments
-            timeout: Request timeout in seconds (default: 10, SetAVTransportURI uses 30)
+            arguments: Action arguments (raw values, XML-escaped here)
+            timeout: Request timeout in seconds (default: 10, SetAVTransportURI uses 15)
+
+        Raises:
+            requests.RequestException: If the request could not be sent
         """
-        arguments = arguments or {}
+        # Build SOAP envelope as bytes around the cached per-action parts;
+        # actions without arguments reuse a fully cached envelope
+        if not arguments and (action, self.instance_id) in _ARGLESS_REQUESTS:
+            envelope, headers = _ARGLESS_REQUESTS[action, self.instance_id]
+            return http_client.post(self.control_url, data=envelope, headers=headers, timeout=timeout,
+                                    fail_fast=True, stream=True)
+
+        if arguments:
+            prefix, suffix = _envelope_parts(action, self.instance_id)
+            parts = [prefix]
+            parts.extend(
+                f"            <{key}>{_xml_escape(str(value))}</{key}>\n".encode('utf-8')
+                for key, value in arguments.items()
+            )
+            parts.append(suffix)
+            envelope = b''.join(parts)
+        else:
+            envelope = _argless_envelope(action, self.instance_id)
 
-        # Build SOAP envelope
-        envelope = f'''<?xml version="1.0" encoding="utf-8"?>
-<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"
-            s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
-    <s:Body>
-        <u:{action} xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">
-            <InstanceID>{self.instance_id}</InstanceID>
-'''
+        headers = _SOAP_HEADERS.get(action) or _build_soap_headers(action)
 
-        for key, value in arguments.items():
-            envelope += f"            <{key}>{value}</{key}>\n"
+        return http_client.post(
+            self.control_url,
+            data=envelope,
+            headers=headers,
+            timeout=timeout,
+            fail_fast=True,
+            stream=True  # Body is read through _read_body, which caps its size
+        )
 
-        envelope += f'''        </u:{action}>
-    </s:Body>
-</s:Envelope>'''
+    def _send_soap_request(self, action: str, arguments: dict = None, timeout: int = 10) -> str | None:
+        """Send SOAP request to DLNA device.
 
-        headers = {
-            'Content-Type': 'text/xml; charset="utf-8"',
-            'SOAPAction': f'"urn:schemas-upnp-org:service:AVTransport:1#{action}"',
-            'Connection': 'close',  # Tell device to close socket after response
-        }
+        Args:
+            action: SOAP action name
+            arguments: Action arguments (raw values, XML-escaped here)
+            timeout: Request timeout in seconds (default: 10, SetAVTransportURI uses 15)
 
+        Returns:
+            Response body on HTTP 200, None otherwise
+        """
         try:
-            response = http_client.post(
-                self.control_url,
-                data=envelope.encode('utf-8'),
-                headers=headers,
-                timeout=timeout
-            )
-
-            if response.status_code == 200:
-                logger.debug(f"SOAP action {action} succeeded")
-                return response.text
-            else:
-                logger.error(f"SOAP action {action} failed: {response.status_code} - {response.text}")
-                return None
-
+            response = self._post_soap(action, arguments, timeout)
+            body = _read_body(response)
         except Exception as e:
             logger.error(f"Failed to send SOAP request {action}: {e}")
             return None
 
+        if body is None:
+            return None
+        if response.status_code == 200:
+            logger.debug(f"SOAP action {action} succeeded")
+            return body
+        else:
+            logger.error(f"SOAP action {action} failed: {response.status_code} - {body}")
+            return None
+
     @staticmethod
     def _build_didl_metadata(uri: str, mime_type: str = 'audio/mpeg') -> str:
         """Build DIDL-Lite XML metadata required by strict DLNA renderers (e.g. Samsung).
 
         Without this metadata Samsung accepts SetAVTransportURI but never initiates GET.
         """
-        # Map MIME type to DLNA profile info
-        profile_map = {
-            'audio/mpeg': 'DLNA.ORG_PN=MP3;DLNA.ORG_OP=00;DLNA.ORG_CI=0;DLNA.ORG_FLAGS=8D100000000000000000000000000000',
-            'audio/mp3':  'DLNA.ORG_PN=MP3;DLNA.ORG_OP=00;DLNA.ORG_CI=0;DLNA.ORG_FLAGS=8D100000000000000000000000000000',
-            'audio/flac': 'DLNA.ORG_PN=FLAC;DLNA.ORG_OP=00;DLNA.ORG_CI=0;DLNA.ORG_FLAGS=8D100000000000000000000000000000',
-        }
-        dlna_profile = profile_map.get(mime_type, '*')
-        protocol_info = f'http-get:*:{mime_type}:{dlna_profile}'
-
-        uri_esc = uri.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
-
-        return (
-            '<DIDL-Lite xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/" '
-            'xmlns:dc="http://purl.org/dc/elements/1.1/" '
-            'xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/">'
-            '<item id="1" parentID="0" restricted="1">'
-            '<dc:title>Radio Stream</dc:title>'
-            '<upnp:class>object.item.audioItem.audioBroadcast</upnp:class>'
-            f'<res protocolInfo="{protocol_info}">{uri_esc}</res>'
-            '</item>'
-            '</DIDL-Lite>'
-        )
+        head, tail = _didl_template(mime_type)
+        return head + _xml_escape(uri) + tail
 
     def set_av_transport_uri(self, uri: str, mime_type: str = 'audio/mpeg') -> bool:
         """Set the URI of the media to play.
@@ -109,32 +400,31 @@ class DLNAClient:
         """
         logger.info(f"Setting AV Transport URI to {uri}")
 
-        # Escape XML entities in URI
-        uri_escaped = uri.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-
-        # DIDL-Lite metadata must be XML-escaped when used as a SOAP string value.
-        # Inserting raw XML would create nested XML instead of the expected string type.
-        didl = self._build_didl_metadata(uri, mime_type)
-        didl_escaped = didl.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
-
+        # DIDL-Lite metadata is sent as a SOAP string value, so _send_soap_request
+        # XML-escapes it like the URI. Inserting raw XML would create nested XML
+        # instead of the expected string type.
         arguments = {
-            'CurrentURI': uri_escaped,
-            'CurrentURIMetaData': didl_escaped
+            'CurrentURI': uri,
+            'CurrentURIMetaData': self._build_didl_metadata(uri, mime_type)
         }
 
         # Use 15s timeout for SetAVTransportURI
         # Devices may need time to validate stream URL connectivity
-        import time
-        start_time = time.time()
-        response = self._send_soap_request('SetAVTransportURI', arguments, timeout=15)
-        elapsed = time.time() - start_time
+        try:
+            response = self._post_soap('SetAVTransportURI', arguments, timeout=15)
+            body = _read_body(response)
+        except Exception as e:
+            logger.error(f"SetAVTransportURI failed: {e}")
+            return False
 
-        if response:
+        # Round-trip time as measured by requests - no separate wall-clock sampling
+        elapsed = response.elapsed.total_seconds()
+        if response.status_code == 200 and body is not None:
             logger.info(f"SetAVTransportURI succeeded in {elapsed:.2f}s")
-        else:
-            logger.error(f"SetAVTransportURI failed after {elapsed:.2f}s")
+            return True
 
-        return response is not None
+        logger.error(f"SetAVTransportURI failed after {elapsed:.2f}s: {response.status_code} - {body}")
+        return False
 
     def play(self, speed: str = "1") -> bool:
         """Start playback."""
@@ -182,71 +472,123 @@ class DLNAClient:
         response = self._send_soap_request('Pause')
         return response is not None
 
-    def get_transport_info(self, retries: int = 2) -> dict | None:
+    def get_transport_info(self, retries: int = 2, base_delay: float = 0.1, max_delay: float = 1.0) -> dict | None:
         """
         Get current transport state with retry logic.
 
+        Retries back off exponentially (base_delay, 2x, 4x ... capped at max_delay)
+        with a little random jitter so several callers don't retry in lockstep.
+        Concurrent calls on the same client share a single in-flight request.
+
         Args:
             retries: Number of retry attempts on failure (default: 2)
+            base_delay: Delay before the first retry in seconds
+            max_delay: Upper bound for the delay between retries in seconds
 
         Returns:
             Dictionary with state and status, or None if all attempts fail
         """
+        with self._transport_info_lock:
+            future = self._transport_info_inflight
+            owner = future is None
+            if owner:
+                future = self._transport_info_inflight = Future()
+
+        if not owner:
+            # Another thread is already asking the device - share its answer
+            result = future.result()
+            return dict(result) if result else None
+
+        try:
+            result = self._fetch_transport_info(retries, base_delay, max_delay)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._transport_info_lock:
+                self._transport_info_inflight = None
+        future.set_result(result)
+        return result
+
+    def _fetch_transport_info(self, retries: int, base_delay: float, max_delay: float,
+                              timeout: float = 10) -> dict | None:
+        """Query the transport state, retrying as described in get_transport_info().
+
+        ``timeout`` bounds each attempt's HTTP request (connect and read).
+        """
         last_error = None
 
         for attempt in range(retries + 1):
+            retryable = True
             try:
-                response = self._send_soap_request('GetTransportInfo')
-
-                if not response:
+                response = self._post_soap('GetTransportInfo', timeout=timeout)
+                body = _read_body(response)
+
+                if body is None:
+                    last_error = "Response too large"
+                    retryable = False
+                elif response.status_code != 200:
+                    logger.error(f"SOAP action GetTransportInfo failed: {response.status_code} - {body}")
+                    last_error = f"HTTP {response.status_code}"
+                    # Client errors and 501 Not Implemented won't go away on retry
+                    retryable = response.status_code >= 500 and response.status_code != 501
+                elif not body:
                     last_error = "No response from device"
-                    if attempt < retries:
-                        logger.debug(f"GetTransportInfo attempt {attempt + 1} failed, retrying...")
-                        import time
-                        time.sleep(0.3)
-                        continue
-                    return None
-
-                root = ET.fromstring(response)
-
-                state_elem = root.find('.//CurrentTransportState')
-                status_elem = root.find('.//CurrentTransportStatus')
-
-                result = {
-                    'state': state_elem.text if state_elem is not None else 'UNKNOWN',
-                    'status': status_elem.text if status_elem is not None else 'UNKNOWN'
-                }
+                else:
+                    result = self._parse_transport_info(body)
 
-                # Success - return immediately
-                if attempt > 0:
-                    logger.debug(f"GetTransportInfo succeeded on attempt {attempt + 1}")
-                return result
+                    # Success - return immediately
+                    if attempt > 0:
+                        logger.debug(f"GetTransportInfo succeeded on attempt {attempt + 1}")
+                    return result
 
             except ET.ParseError as e:
                 last_error = f"Parse error: {e}"
-                if attempt < retries:
-                    logger.debug(f"GetTransportInfo parse error on attempt {attempt + 1}, retrying...")
-                    import time
-                    time.sleep(0.3)
-                    continue
             except Exception as e:
+                logger.error(f"Failed to send SOAP request GetTransportInfo: {e}")
                 last_error = str(e)
-                if attempt < retries:
-                    logger.debug(f"GetTransportInfo error on attempt {attempt + 1}: {e}, retrying...")
-                    import time
-                    time.sleep(0.3)
-                    continue
+                # Nothing is listening - the device is off or the port is wrong
+                retryable = not _is_connection_refused(e)
+
+            if not retryable or attempt >= retries:
+                break
+            logger.debug(f"GetTransportInfo attempt {attempt + 1} failed ({last_error}), retrying...")
+            time.sleep(self._backoff_delay(attempt, base_delay, max_delay))
 
-        logger.debug(f"GetTransportInfo failed after {retries + 1} attempts: {last_error}")
+        logger.debug(f"GetTransportInfo failed after {attempt + 1} attempts: {last_error}")
         return None
 
-    def play_url(self, url: str, mime_type: str = 'audio/mpeg', max_retries: int = 3) -> bool:
+    @staticmethod
+    def _parse_transport_info(body: str) -> dict[str, str | None]:
+        """Read state and status from a GetTransportInfo response body."""
+        # Fast path: the response shape is fixed, so find both values without parsing
+        state_match = _STATE_RE.search(body)
+        status_match = _STATUS_RE.search(body) if state_match else None
+        if state_match and status_match:
+            return {'state': state_match.group(1).strip(), 'status': status_match.group(1).strip()}
+
+        values = _find_elements_text(body, _TRANSPORT_INFO_ELEMENTS)
+        return {
+            'state': values.get('CurrentTransportState', 'UNKNOWN'),
+            'status': values.get('CurrentTransportStatus', 'UNKNOWN')
+        }
+
+    @staticmethod
+    def _backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+        """Exponential backoff delay for a retry, with up to 10% jitter on top."""
+        delay = min(max_delay, base_delay * (2 ** attempt))
+        return delay + random.uniform(0, delay * 0.1)
+
+    def play_url(self, url: str, mime_type: str = 'audio/mpeg', max_retries: int = 3,
+                 prepare_timeout: float = 1.5) -> bool:
         """
         Set URI and start playback with retry logic.
 
         Args:
             url: Stream URL to play
             max_retries: Number of retry attempts for Play command
+            prepare_timeout: Maximum seconds to wait for the device to load the URI
+                before sending Play (0 = don't wait)
 
         Returns:
             True if successful, False otherwise
@@ -254,10 +596,9 @@ class DLNAClient:
         if not self.set_av_transport_uri(url, mime_type):
             return False
 
-        # Wait for device to process URI before sending Play command
-        # Some devices (e.g., Panasonic PMX9) need time to prepare stream
-        import time
-        time.sleep(1.5)
+        # Some devices (e.g., Panasonic PMX9) reject Play while still loading the URI -
+        # wait until they leave TRANSITIONING, for at most prepare_timeout seconds
+        self._wait_until_prepared(prepare_timeout)
 
         # Retry Play command - device may need time to buffer stream
         for attempt in range(max_retries):
@@ -269,6 +610,22 @@ class DLNAClient:
 
         return False
 
+    def _wait_until_prepared(self, timeout: float, poll_interval: float = 0.1):
+        """
+        Poll the transport state until the device has left TRANSITIONING, for at most ``timeout`` seconds.
+
+        Each poll is a single GetTransportInfo request bounded by the time left, so devices
+        that hang or don't answer delay Play by ``timeout`` at most. Polls bypass the shared
+        in-flight request of get_transport_info(), whose retries could outlast the wait.
+        """
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            info = self._fetch_transport_info(0, 0, 0, timeout=min(remaining, 10))
+            if info and info.get('state') not in (None, 'UNKNOWN', 'TRANSITIONING'):
+                logger.debug(f"Device ready in state {info['state']} after {timeout - remaining:.2f}s")
+                return
+            time.sleep(min(poll_interval, max(0.0, deadline - time.monotonic())))
+
     def get_protocol_info(self) -> str | None:
         """
         Get supported protocols and formats from the device.
@@ -288,44 +645,113 @@ class DLNAClient:
     </s:Body>
 </s:Envelope>'''
 
-        headers = {
-            'Content-Type': 'text/xml; charset="utf-8"',
-            'SOAPAction': '"urn:schemas-upnp-org:service:ConnectionManager:1#GetProtocolInfo"',
-        }
-
         try:
             response = http_client.post(
                 self.connection_manager_url,
                 data=envelope.encode('utf-8'),
-                headers=headers,
-                timeout=10
+                headers=_PROTOCOL_INFO_HEADERS,
+                timeout=10,
+                fail_fast=True,
+                stream=True
             )
+            body = _read_body(response, _MAX_PROTOCOL_INFO_SIZE)
 
+            if body is None:
+                return None
             if response.status_code == 200:
                 # Parse response to extract Sink protocols (what device can play)
-                root = ET.fromstring(response.text)
-                sink_elem = root.find('.//{*}Sink')
-                if sink_elem is not None and sink_elem.text:
-                    logger.debug(f"Device supports protocols: {sink_elem.text[:200]}...")
-                    return sink_elem.text
+                sink = _find_element_text(body, 'Sink')
+                if sink:
+                    logger.debug(f"Device supports protocols: {sink[:200]}...")
+                    return sink
                 else:
                     logger.warning("Could not find Sink element in GetProtocolInfo response")
                     return None
             else:
-                logger.warning(f"GetProtocolInfo failed: {response.status_code} - {response.text[:200]}")
+                logger.warning(f"GetProtocolInfo failed: {response.status_code} - {body[:200]}")
                 return None
 
         except Exception as e:
             logger.warning(f"Failed to get protocol info: {e}")
             return None
 
+    @staticmethod
+    def load_capabilities_cache(path: str):
+        """
+        Persist detected capabilities to a JSON file and load the entries saved there.
+
+        Devices detected within _CAPABILITIES_TTL, e.g. before a restart, then skip
+        the GetProtocolInfo round trip.
+
+        Args:
+            path: Capabilities cache file (created on the first detection)
+        """
+        global _capabilities_file
+
+        loaded = {}
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            now = time.time()
+            for key, entry in data.items():
+                if now - entry['detected_at'] < _CAPABILITIES_TTL:
+                    loaded[key] = (entry['detected_at'], entry['capabilities'])
+        except FileNotFoundError:
+            logger.debug(f"No capabilities cache file at {path} yet")
+        except Exception as e:
+            logger.warning(f"Failed to load capabilities cache {path}: {e}")
+            loaded = {}
+
+        with _capabilities_lock:
+            _capabilities_file = path
+            _capabilities_cache.update(loaded)
+        logger.info(f"Loaded {len(loaded)} cached device capabilities from {path}")
+
+    @staticmethod
+    def invalidate_capabilities_cache(host: str | None = None, port: int | None = None,
+                                      udn: str | None = None):
+        """
+        Drop cached capabilities so the next detect_capabilities() queries the device.
+
+        Without arguments the whole cache is cleared.
+
+        Args:
+            host: Host of a device without UDN to invalidate
+            port: Device port; if omitted, entries for every port of host are dropped
+            udn: UDN of a device to invalidate
+        """
+        with _capabilities_lock:
+            if host is None and udn is None:
+                _capabilities_cache.clear()
+            if udn is not None:
+                _capabilities_cache.pop(udn, None)
+            if host is not None and port is not None:
+                _capabilities_cache.pop(f"{host}:{port}", None)
+            elif host is not None:
+                for key in list(_capabilities_cache):
+                    key_host, _, key_port = key.rpartition(':')
+                    if key_host == host and key_port.isdigit():  # UDN keys never match
+                        del _capabilities_cache[key]
+            _save_capabilities_cache()
+
     def detect_capabilities(self) -> dict[str, Any]:
         """
         Detect device capabilities including supported audio formats.
 
+        Results are shared across client instances for the same device for
+        _CAPABILITIES_TTL seconds; see invalidate_capabilities_cache().
+
         Returns:
             Dictionary with capability information
         """
+        cache_key = self.udn or f"{self.device_host}:{self.device_port}"
+        with _capabilities_lock:
+            cached = _capabilities_cache.get(cache_key)
+        if cached and time.time() - cached[0] < _CAPABILITIES_TTL:
+            self.capabilities = dict(cached[1])
+            logger.debug(f"Using cached capabilities for {cache_key}")
+            return self.capabilities
+
         protocol_info = self.get_protocol_info()
 
         capabilities = {
@@ -341,26 +767,13 @@ class DLNAClient:
             # Log first 500 chars to see what device actually supports
             logger.debug(f"Raw protocol info (first 500 chars): {protocol_info[:500]}")
 
-            # Parse protocol info - format is comma-separated list of:
-            # protocol:network:contentFormat:additionalInfo
-            # e.g., http-get:*:audio/mpeg:*
-            protocols = protocol_info.split(',')
-
-            for proto in protocols:
-                proto_lower = proto.lower()
-                if 'audio/mpeg' in proto_lower or 'audio/mp3' in proto_lower:
-                    capabilities['supports_mp3'] = True
-                    logger.debug(f"Found MP3 support: {proto.strip()}")
-                if 'audio/aac' in proto_lower or 'audio/x-aac' in proto_lower or 'audio/mp4' in proto_lower:
-                    capabilities['supports_aac'] = True
-                    logger.debug(f"Found AAC support: {proto.strip()}")
-                if 'audio/flac' in proto_lower or 'audio/x-flac' in proto_lower:
-                    capabilities['supports_flac'] = True
-                    logger.debug(f"Found FLAC support: {proto.strip()}")
-                if 'audio/wav' in proto_lower or 'audio/x-wav' in proto_lower:
-                    capabilities['supports_wav'] = True
-                if 'audio/ogg' in proto_lower or 'audio/x-ogg' in proto_lower:
-                    capabilities['supports_ogg'] = True
+            for flag in _parse_protocol_info(protocol_info):
+                capabilities[flag] = True
+
+            # Only cache successful detections so unreachable devices are retried
+            with _capabilities_lock:
+                _capabilities_cache[cache_key] = (time.time(), dict(capabilities))
+                _save_capabilities_cache()
 
         self.capabilities = capabilities
         logger.info(f"Device capabilities: MP3={capabilities['supports_mp3']}, "
@@ -369,6 +782,25 @@ class DLNAClient:
 
         return capabilities
 
+    @classmethod
+    def detect_many(cls, clients: list['DLNAClient']) -> dict[str, dict[str, Any]]:
+        """
+        Detect capabilities of several devices in parallel.
+
+        Args:
+            clients: Clients for the devices to query
+
+        Returns:
+            Dictionary mapping device UDN (or host:port without one) to its capabilities
+        """
+        if not clients:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(16, len(clients))) as executor:
+            results = executor.map(cls.detect_capabilities, clients)
+            return {client.udn or f"{client.device_host}:{client.device_port}": caps
+                    for client, caps in zip(clients, results)}
+
     def can_play_format(self, mime_type: str) -> bool:
         """
         Check if device can play a specific MIME type.
@@ -386,23 +818,5 @@ class DLNAClient:
             # If we can't detect capabilities, assume transcoding is needed
             return False
 
-        mime_lower = mime_type.lower()
-
-        # MP3 detection
-        if 'mpeg' in mime_lower or 'mp3' in mime_lower:
-            return self.capabilities.get('supports_mp3', False)
-
-        # AAC detection (multiple formats)
-        # Common AAC MIME types: audio/aac, audio/aacp, audio/mp4, audio/vnd.dlna.adts, audio/x-hx-aac-adts
-        elif any(fmt in mime_lower for fmt in ['aac', 'mp4', 'adts', 'm4a']):
-            return self.capabilities.get('supports_aac', False)
-
-        # Other formats
-        elif 'flac' in mime_lower:
-            return self.capabilities.get('supports_flac', False)
-        elif 'wav' in mime_lower:
-            return self.capabilities.get('supports_wav', False)
-        elif 'ogg' in mime_lower:
-            return self.capabilities.get('supports_ogg', False)
-
-        return False
+        flag = _capability_flag_for_mime(mime_type.lower())
+        return self.capabilities.get(flag, False) if flag else False
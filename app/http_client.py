@@ -1,129 +1,569 @@
 """HTTP client with connection pooling and timeout management."""
 
+import ipaddress
 import logging
+import random
+import socket
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from threading import BoundedSemaphore, Lock
 from typing import Any
+from urllib.parse import quote, urlsplit
 
 import requests
 from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import MaxRetryError, ReadTimeoutError, ResponseError
+from urllib3.util.connection import allowed_gai_family
 from urllib3.util.retry import Retry
 
+try:
+    import requests_unixsocket
+except ImportError:  # Optional - http+unix:// URLs are unsupported when not installed
+    requests_unixsocket = None
+
 logger = logging.getLogger(__name__)
 
+# End-to-end deadline (time.monotonic()) of the request being sent on this thread/context,
+# seen by the retry policy so retries and backoff never run past it
+_deadline: ContextVar[float | None] = ContextVar('http_client_deadline', default=None)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without sending a request while the circuit breaker for a host is open."""
+
+
+class _Breaker:
+    """
+    Consecutive connection failures to one host (CLOSED until the threshold, then OPEN).
+
+    Once the recovery window has passed the breaker is HALF_OPEN: the first caller
+    sends a trial request (``probing`` is set) and everyone else is still rejected.
+    """
+
+    __slots__ = ('failures', 'opened_at', 'probing')
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+
+class JitteredRetry(Retry):
+    """
+    Retry with "full jitter" backoff that respects the request deadline.
+
+    Sleeps a random time between 0 and the usual exponential backoff, so clients
+    retrying against the same flaky device don't all come back in lockstep.
+    Once the deadline of the current request has passed, no further attempt is made.
+    """
+
+    def get_backoff_time(self) -> float:
+        backoff = random.uniform(0, super().get_backoff_time())
+        deadline = _deadline.get()
+        if deadline is not None:
+            backoff = min(backoff, max(0.0, deadline - time.monotonic()))
+        return backoff
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        deadline = _deadline.get()
+        if deadline is not None and time.monotonic() >= deadline:
+            raise MaxRetryError(_pool, url, error or ResponseError("request deadline exceeded"))
+        return new_retry
+
+
+DEFAULT_TIMEOUT = 10.0
+# A renderer that doesn't accept a TCP connection within this many seconds is treated as offline
+# (fail_fast requests only - internet hosts such as radio streams may legitimately be slower)
+_CONNECT_TIMEOUT = 2.0
+
+
+def _split_timeout(timeout: Any) -> Any:
+    """Expand a single-number timeout to (connect, read) so dead devices fail within _CONNECT_TIMEOUT."""
+    if isinstance(timeout, (int, float)):
+        return min(timeout, _CONNECT_TIMEOUT), timeout
+    return timeout
+
+
+def _is_unreachable(exc: requests.RequestException) -> bool:
+    """
+    Check whether a request error means the host could not be reached.
+
+    Read timeouts don't count: the host accepted the connection and is only slow
+    to answer (retried GET/HEAD report them as a ConnectionError wrapping MaxRetryError).
+    """
+    if isinstance(exc, requests.ReadTimeout):
+        return False
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return not isinstance(reason, ReadTimeoutError)
+
+
+def _clamp_timeout(timeout: Any, remaining: float) -> Any:
+    """Shrink a requests timeout (seconds or (connect, read) tuple) to the time left until the deadline."""
+    if isinstance(timeout, tuple):
+        return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+# Resolved addresses of hostnames this client connects to: (host, port) -> (resolved at, address)
+_DNS_TTL = 60.0
+_dns_cache: dict[tuple[str, int], tuple[float, str]] = {}
+
+
+def _resolve(host: str, port: int) -> str:
+    """
+    Resolve a hostname to an address, cached for _DNS_TTL seconds.
+
+    IP literals (the usual case for LAN renderers) and names that fail to resolve
+    are returned unchanged, leaving them and their errors to urllib3.
+    """
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+
+    now = time.monotonic()
+    cached = _dns_cache.get((host, port))
+    if cached and now - cached[0] < _DNS_TTL:
+        return cached[1]
+
+    try:
+        infos = socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+    except OSError:
+        return host
+    address = infos[0][4][0]
+    _dns_cache[(host, port)] = (now, address)
+    return address
+
+
+class _CachedDNSMixin:
+    """Connect to the cached address of the host; TLS and Host headers still use the name."""
+
+    def _new_conn(self):
+        host = self._dns_host
+        self._dns_host = _resolve(host, self.port)
+        try:
+            return super()._new_conn()
+        except Exception:
+            _dns_cache.pop((host, self.port), None)  # Address may be stale - resolve again next time
+            raise
+        finally:
+            self._dns_host = host
+
+
+class _HTTPConnection(_CachedDNSMixin, HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_CachedDNSMixin, HTTPSConnection):
+    pass
+
+
+# POST keyword arguments the prepared-request fast path handles, and how many templates to keep
+_PREPARABLE_POST_KWARGS = frozenset({'data', 'headers', 'stream'})
+_PREPARED_CACHE_SIZE = 64
+
+# Pooled keep-alive connections idle longer than this are reconnected instead of reused:
+# renderers, NAT and load balancers silently drop idle sockets and reuse then fails with a reset
+_MAX_IDLE_TIME = 30.0
+
+
+class _IdleCapMixin:
+    """Connection pool that drops connections which sat idle for more than _MAX_IDLE_TIME."""
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        idle_since = getattr(conn, 'idle_since', None)
+        if idle_since is not None and time.monotonic() - idle_since > _MAX_IDLE_TIME:
+            conn.close()  # Reconnects on the next request
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.idle_since = time.monotonic()
+        super()._put_conn(conn)
+
+
+class _HTTPConnectionPool(_IdleCapMixin, HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+
+class _HTTPSConnectionPool(_IdleCapMixin, HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose (non-proxy) connection pools cache DNS and cap connection idle time."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+
+def _build_retry() -> Retry:
+    """Retry policy shared by all mounted adapters."""
+    return JitteredRetry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["HEAD", "GET", "OPTIONS"]
+    )
+
+
+def _build_unix_adapter(pool_connections: int, pool_maxsize: int) -> HTTPAdapter:
+    """Adapter for http+unix:// URLs (requires requests-unixsocket)."""
+    return requests_unixsocket.UnixAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
 
 class HTTPClient:
     """
     HTTP client with connection pooling and configurable timeouts.
 
     This class provides a singleton session with connection pooling to improve
-    performance for multiple HTTP requests.
+    performance for multiple HTTP requests. The session is only created on the
+    first request, so importing this module (e.g. for SSDP-only use) stays cheap.
     """
 
+    # After this many consecutive connection failures a host is skipped for _BREAKER_RECOVERY
+    # seconds; then a single trial request is let through (HALF_OPEN) before closing or reopening
+    _BREAKER_THRESHOLD = 5
+    _BREAKER_RECOVERY = 30.0
+
     _instance: 'HTTPClient | None' = None
+    _instance_lock = Lock()  # Guards singleton creation and initialization
+    _initialized = False
     _session: requests.Session | None = None
+    _adapter: HTTPAdapter | None = None
+    _pool_sizes: tuple[int, int] = (16, 32)  # (pool_connections, pool_maxsize) of _adapter
 
     def __new__(cls):
-        """Singleton pattern to ensure only one instance exists."""
+        """Singleton pattern to ensure only one instance exists (thread-safe)."""
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
         return cls._instance
 
     def __init__(self):
-        """Initialize HTTP client with connection pooling."""
-        if self._session is not None:
-            return  # Already initialized
-
-        self._session = requests.Session()
-
-        # Configure retry strategy
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=0.3,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["HEAD", "GET", "OPTIONS"]
-        )
-
-        # Configure HTTP adapter with connection pooling
-        adapter = HTTPAdapter(
-            pool_connections=10,
-            pool_maxsize=20,
-            max_retries=retry_strategy
-        )
-
-        self._session.mount("http://", adapter)
-        self._session.mount("https://", adapter)
-
-        logger.info("HTTP client initialized with connection pooling")
+        """Initialize HTTP client; the pooled session is created on first use."""
+        if self._initialized:
+            return
 
-    def configure(self, pool_connections: int = 10, pool_maxsize: int = 20):
+        with self._instance_lock:
+            if self._initialized:
+                return  # Another thread finished initializing while we waited
+
+            self._session_lock = Lock()
+            # Circuit breakers of hosts with recent connection failures, keyed by netloc
+            self._breakers: dict[str, _Breaker] = {}
+            self._breakers_lock = Lock()
+            # Bulkhead: callers beyond the pool size wait here instead of piling onto the pool
+            self._bulkhead = BoundedSemaphore(self._pool_sizes[1])
+            # Prepared POST templates: (url, id(headers)) -> (headers, PreparedRequest)
+            self._prepared: dict[tuple[str, int], tuple[Any, requests.PreparedRequest]] = {}
+            self._initialized = True
+
+    def _get_session(self) -> requests.Session:
+        """Return the pooled session, creating it on first use."""
+        session = self._session
+        if session is not None:
+            return session
+
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+
+                # Configure HTTP adapter with connection pooling. Sized for discovery, which fans
+                # out to many devices at once and probes several ports per host.
+                pool_connections, pool_maxsize = self._pool_sizes
+                self._adapter = _PooledAdapter(
+                    pool_connections=pool_connections,
+                    pool_maxsize=pool_maxsize,
+                    max_retries=_build_retry()
+                )
+
+                session.mount("http://", self._adapter)
+                session.mount("https://", self._adapter)
+                if requests_unixsocket is not None:
+                    # Local peers (e.g. a renderer emulator in tests) can skip the TCP stack
+                    session.mount("http+unix://", _build_unix_adapter(pool_connections, pool_maxsize))
+                self._session = session
+
+                logger.info("HTTP client initialized with connection pooling")
+            return self._session
+
+    def configure(self, pool_connections: int = 16, pool_maxsize: int = 32):
         """
         Configure connection pool size.
 
+        A no-op when the sizes are unchanged, so warm keep-alive connections survive.
+        Otherwise the TCP adapter is resized in place and keeps its retry policy; the
+        Unix socket adapter (if mounted) is replaced by one with the new sizes.
+
         Args:
             pool_connections: Number of connection pools to cache
             pool_maxsize: Maximum number of connections per pool
         """
-        if self._session is None:
+        if (pool_connections, pool_maxsize) == self._pool_sizes:
+            logger.debug("HTTP client pool sizes unchanged, keeping existing connections")
             return
 
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=0.3,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["HEAD", "GET", "OPTIONS"]
-        )
-
-        adapter = HTTPAdapter(
-            pool_connections=pool_connections,
-            pool_maxsize=pool_maxsize,
-            max_retries=retry_strategy
-        )
+        with self._session_lock:
+            if self._adapter is not None:
+                old_poolmanager = self._adapter.poolmanager
+                self._adapter.init_poolmanager(pool_connections, pool_maxsize)
+                old_poolmanager.clear()  # Close idle sockets sized for the old limits
+
+                # UnixAdapter keeps its own pool container instead of a poolmanager
+                old_unix_adapter = self._session.adapters.get("http+unix://")
+                if old_unix_adapter is not None:
+                    self._session.mount("http+unix://", _build_unix_adapter(pool_connections, pool_maxsize))
+                    old_unix_adapter.close()
+            # Otherwise the session doesn't exist yet and will be created with these sizes
+            self._pool_sizes = (pool_connections, pool_maxsize)
+        # Requests in flight release the semaphore they acquired, so swapping is safe
+        self._bulkhead = BoundedSemaphore(pool_maxsize)
+
+        logger.info("HTTP client reconfigured: pool_connections=%d, pool_maxsize=%d", pool_connections, pool_maxsize)
+
+    def _send(self, send: Callable[..., requests.Response], url: str, timeout: Any,
+              deadline: float | None, fail_fast: bool = False, **kwargs) -> requests.Response:
+        """
+        Send a request; with ``fail_fast``, through the circuit breaker of its host and
+        with the connect timeout capped at _CONNECT_TIMEOUT.
 
-        self._session.mount("http://", adapter)
-        self._session.mount("https://", adapter)
+        Only connection failures count towards opening the circuit; read timeouts
+        and other errors don't. At most pool_maxsize requests are sent at once; further callers block until
+        one finishes. For streamed responses the slot is freed once headers arrive.
 
-        logger.info(f"HTTP client reconfigured: pool_connections={pool_connections}, pool_maxsize={pool_maxsize}")
+        The read timeout doubles as the end-to-end deadline, so retries can't
+        multiply it. Each attempt's timeout is clamped to the time left.
 
-    def get(self, url: str, timeout: int = 10, **kwargs) -> requests.Response:
+        Raises:
+            CircuitOpenError: If the host failed repeatedly and is still in its recovery window
+            requests.Timeout: If the deadline passed before the request could be sent
+        """
+        host = urlsplit(url).netloc
+        if fail_fast:
+            timeout = _split_timeout(timeout)
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        if deadline is None and read_timeout is not None:
+            deadline = time.monotonic() + read_timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout(f"Deadline exceeded before request to {host}")
+            timeout = _clamp_timeout(timeout, remaining)
+
+        trial = None
+        if fail_fast and host in self._breakers:
+            with self._breakers_lock:
+                breaker = self._breakers.get(host)
+                if breaker is not None and breaker.opened_at is not None:
+                    if breaker.probing or time.monotonic() - breaker.opened_at < self._BREAKER_RECOVERY:
+                        raise CircuitOpenError(
+                            f"Circuit open for {host} after {breaker.failures} consecutive failures"
+                        )
+                    breaker.probing = True  # HALF_OPEN - this caller is the only one let through
+                    trial = breaker
+            if trial is not None:
+                logger.debug("Circuit half-open for %s, sending trial request", host)
+
+        token = _deadline.set(deadline)
+        try:
+            with self._bulkhead:
+                response = send(url, timeout=timeout, **kwargs)
+        except BaseException as e:
+            if fail_fast:
+                if isinstance(e, (requests.ConnectionError, requests.Timeout)) and _is_unreachable(e):
+                    self._record_failure(host)
+                elif trial is not None:
+                    with self._breakers_lock:
+                        trial.probing = False  # Inconclusive - let the next caller try
+            raise
+        finally:
+            _deadline.reset(token)
+
+        if fail_fast and host in self._breakers:
+            with self._breakers_lock:
+                self._breakers.pop(host, None)  # Host answered - close its circuit
+        return response
+
+    def _record_failure(self, host: str):
+        """Count a connection failure and open the host's circuit at the threshold."""
+        with self._breakers_lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = _Breaker()
+            breaker.failures += 1
+            breaker.probing = False
+            if breaker.failures >= self._BREAKER_THRESHOLD:
+                if breaker.opened_at is None:
+                    logger.warning("Circuit opened for %s after %d consecutive failures", host, breaker.failures)
+                breaker.opened_at = time.monotonic()  # (Re)open - also after a failed trial request
+
+    def get(self, url: str, timeout: tuple[float, float] | float = DEFAULT_TIMEOUT, deadline: float | None = None,
+            fail_fast: bool = False, **kwargs) -> requests.Response:
         """
         Send GET request.
 
         Args:
             url: URL to request
-            timeout: Request timeout in seconds
+            timeout: (connect, read) timeouts in seconds, or a single number for both
+            deadline: time.monotonic() by which the request, retries included, must
+                complete (default: read timeout seconds from now)
+            fail_fast: Target is a LAN device - cap a single-number timeout's connect part
+                at 2s and skip the host while its circuit breaker is open
             **kwargs: Additional arguments for requests.get
 
         Returns:
             Response object
         """
-        return self._session.get(url, timeout=timeout, **kwargs)
+        return self._send(self._get_session().get, url, timeout, deadline, fail_fast, **kwargs)
 
-    def head(self, url: str, timeout: int = 10, **kwargs) -> requests.Response:
+    def head(self, url: str, timeout: tuple[float, float] | float = DEFAULT_TIMEOUT, deadline: float | None = None,
+             fail_fast: bool = False, **kwargs) -> requests.Response:
         """
         Send HEAD request.
 
         Args:
             url: URL to request
-            timeout: Request timeout in seconds
+            timeout: (connect, read) timeouts in seconds, or a single number for both
+            deadline: time.monotonic() by which the request, retries included, must
+                complete (default: read timeout seconds from now)
+            fail_fast: Target is a LAN device - cap a single-number timeout's connect part
+                at 2s and skip the host while its circuit breaker is open
             **kwargs: Additional arguments for requests.head
 
         Returns:
             Response object
         """
-        return self._session.head(url, timeout=timeout, **kwargs)
+        return self._send(self._get_session().head, url, timeout, deadline, fail_fast, **kwargs)
 
-    def post(self, url: str, timeout: int = 10, **kwargs) -> requests.Response:
+    def post(self, url: str, timeout: tuple[float, float] | float = DEFAULT_TIMEOUT, deadline: float | None = None,
+             fail_fast: bool = False, **kwargs) -> requests.Response:
         """
         Send POST request.
 
         Args:
             url: URL to request
-            timeout: Request timeout in seconds
+            timeout: (connect, read) timeouts in seconds, or a single number for both
+            deadline: time.monotonic() by which the request, retries included, must
+                complete (default: read timeout seconds from now)
+            fail_fast: Target is a LAN device - cap a single-number timeout's connect part
+                at 2s and skip the host while its circuit breaker is open
             **kwargs: Additional arguments for requests.post
 
         Returns:
             Response object
         """
-        return self._session.post(url, timeout=timeout, **kwargs)
+        if isinstance(kwargs.get('data'), bytes) and kwargs.keys() <= _PREPARABLE_POST_KWARGS:
+            # Hot path (SOAP control): reuse the prepared request for this URL and header set
+            return self._send(self._post_prepared, url, timeout, deadline, fail_fast, **kwargs)
+        return self._send(self._get_session().post, url, timeout, deadline, fail_fast, **kwargs)
+
+    def _post_prepared(self, url: str, timeout: Any, data: bytes, headers: dict[str, str] | None = None,
+                       stream: bool = False) -> requests.Response:
+        """
+        POST raw bytes using a cached PreparedRequest for (url, headers).
+
+        Skips Session.prepare_request (URL parsing, header/cookie merging) after the first
+        call; only the body and its Content-Length are replaced. Callers pass the same
+        headers dict object for repeated requests (e.g. one per SOAP action).
+        """
+        session = self._get_session()
+        key = (url, id(headers))
+        cached = self._prepared.get(key)
+        if cached is None or cached[0] is not headers:
+            template = session.prepare_request(requests.Request('POST', url, headers=headers, data=data))
+            if len(self._prepared) >= _PREPARED_CACHE_SIZE:
+                self._prepared.clear()
+            self._prepared[key] = (headers, template)
+        else:
+            template = cached[1]
+
+        # Sending may follow redirects and extract cookies - never hand out the template itself
+        prepared = template.copy()
+        prepared.body = data
+        prepared.headers['Content-Length'] = str(len(data))
+        return session.send(prepared, timeout=timeout, stream=stream, allow_redirects=True)
+
+    def get_many(self, urls: list[str], timeout: tuple[float, float] | float = DEFAULT_TIMEOUT,
+                 **kwargs) -> list[requests.Response | Exception]:
+        """
+        Send GET requests to several URLs in parallel over the shared session.
+
+        Args:
+            urls: URLs to request
+            timeout: (connect, read) timeouts in seconds (per request), as for get()
+            **kwargs: Additional arguments for requests.get
+
+        Returns:
+            One entry per URL, in order: the response, or the exception the request raised
+        """
+        if not urls:
+            return []
+
+        def fetch(url: str) -> requests.Response | Exception:
+            try:
+                return self.get(url, timeout=timeout, **kwargs)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=min(len(urls), self._pool_sizes[1]),
+                                thread_name_prefix="http-get-many") as executor:
+            return list(executor.map(fetch, urls))
+
+    def stream(self, url: str, chunk_size: int = 64 * 1024,
+               timeout: tuple[float, float] | float = DEFAULT_TIMEOUT, **kwargs) -> Iterator[bytes]:
+        """
+        GET a URL and yield its body in chunks, without buffering the whole response.
+
+        The connection is returned to the pool once the body is exhausted or the
+        generator is closed.
+
+        Args:
+            url: URL to request
+            chunk_size: Maximum bytes per yielded chunk
+            timeout: (connect, read) timeouts in seconds, as for get(); the read timeout
+                applies to each chunk, not the whole body
+            **kwargs: Additional arguments for requests.get
+
+        Yields:
+            Raw body bytes
+
+        Raises:
+            requests.HTTPError: If the server responds with an error status
+        """
+        with self.get(url, timeout=timeout, stream=True, **kwargs) as response:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size)
+
+    def get_unix(self, sock_path: str, path: str = "/", **kwargs) -> requests.Response:
+        """
+        Send GET request to an HTTP server listening on a Unix domain socket.
+
+        Args:
+            sock_path: Filesystem path of the socket (a leading NUL selects the abstract namespace)
+            path: Request path on the server, including any query string
+            **kwargs: Additional arguments for get()
+
+        Returns:
+            Response object
+
+        Raises:
+            RuntimeError: If requests-unixsocket is not installed
+        """
+        if requests_unixsocket is None:
+            raise RuntimeError("Unix socket transport requires the requests-unixsocket package")
+        if not path.startswith("/"):
+            path = f"/{path}"
+        return self.get(f"http+unix://{quote(sock_path, safe='')}{path}", **kwargs)
 
     def close(self):
         """Close the session and cleanup resources."""
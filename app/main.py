@@ -1,16 +1,22 @@
 """Main Flask application for DLNA Radio Streamer."""
 
+import ipaddress
 import json
 import logging
 import os
-import re
 import socket
 import subprocess
 import sys
+import time
 from urllib.parse import urlparse
 
 from flask import Flask, jsonify, render_template, request
 
+try:
+    import orjson
+except ImportError:  # Optional - stdlib json is used when orjson is not installed
+    orjson = None
+
 from app import __version__
 from app.config import Config
 from app.device_manager import DeviceManager
@@ -81,16 +87,30 @@ stream_cache: StreamFormatCache | None = None
 rate_limiter = None  # Will be initialized after config is loaded
 
 
+# Detected local IP and when it was detected (time.monotonic()); re-detected after the TTL
+# in case the network configuration changed
+_LOCAL_IP_TTL = 300.0
+_local_ip_cache: tuple[float, str] | None = None
+
+
 def get_local_ip() -> str:
-    """Get local IP address of the server."""
+    """Get local IP address of the server (cached for _LOCAL_IP_TTL seconds)."""
+    global _local_ip_cache
+
+    cached = _local_ip_cache
+    now = time.monotonic()
+    if cached is not None and now - cached[0] < _LOCAL_IP_TTL:
+        return cached[1]
+
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
-        return local_ip
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            local_ip = s.getsockname()[0]
     except Exception:
-        return "127.0.0.1"
+        return "127.0.0.1"  # Not cached - retry detection on the next call
+
+    _local_ip_cache = (now, local_ip)
+    return local_ip
 
 
 def validate_ip_address(ip: str) -> bool:
@@ -103,19 +123,15 @@ def validate_ip_address(ip: str) -> bool:
     Returns:
         True if valid IPv4 format, False otherwise
     """
-    # Strict regex: only digits and dots, 4 octets
-    ip_pattern = re.compile(r'^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}$')
-    if not ip_pattern.match(ip):
-        return False
+    if not isinstance(ip, str):
+        return False  # IPv4Address would also accept integers and packed bytes
 
-    # Additional check: each octet must be 0-255
+    # Strict dotted-quad parser: ASCII digits and dots only, 4 octets of 0-255,
+    # no whitespace and no leading zeros (ambiguous octal)
     try:
-        octets = ip.split('.')
-        for octet in octets:
-            if int(octet) > 255:
-                return False
+        ipaddress.IPv4Address(ip)
         return True
-    except ValueError:
+    except ValueError:  # AddressValueError is a subclass
         return False
 
 
@@ -132,6 +148,19 @@ def validate_boolean_string(value: str) -> bool:
     return value in ('true', 'false')
 
 
+# Localhost and loopback addresses (SSRF protection)
+_BLOCKED_HOSTS = frozenset({
+    'localhost',
+    '127.0.0.1',
+    '0.0.0.0',
+    '::1',  # IPv6 loopback
+    '0:0:0:0:0:0:0:1',  # IPv6 loopback expanded
+})
+
+# Cloud metadata endpoints (AWS, Azure, GCP) and IPv6 private addresses
+_BLOCKED_HOST_PREFIXES = ('169.254.', 'fd00:')
+
+
 def validate_stream_url(url: str) -> bool:
     """
     Validate stream URL - must be valid http or https URL.
@@ -157,21 +186,8 @@ def validate_stream_url(url: str) -> bool:
         if not hostname:
             return False
 
-        # Block localhost and loopback addresses (SSRF protection)
-        blocked_hosts = {
-            'localhost',
-            '127.0.0.1',
-            '0.0.0.0',
-            '::1',  # IPv6 loopback
-            '0:0:0:0:0:0:0:1',  # IPv6 loopback expanded
-        }
-        if hostname.lower() in blocked_hosts:
-            return False
-
-        # Block cloud metadata endpoints (AWS, Azure, GCP)
-        if hostname.startswith('169.254.'):  # AWS metadata
-            return False
-        if hostname.startswith('fd00:'):  # IPv6 private
+        # urlparse already lowercases hostname, so no per-call lower() is needed
+        if hostname in _BLOCKED_HOSTS or hostname.startswith(_BLOCKED_HOST_PREFIXES):
             return False
 
         # Block private IP ranges (optional - can be relaxed for local streams)
@@ -196,7 +212,8 @@ def _create_dlna_client_from_device(device_info: dict) -> DLNAClient:
         device_port=device_info.get('port', 8080),
         protocol='http',  # TODO: detect from control_url if needed
         control_url=device_info.get('control_url'),
-        connection_manager_url=device_info.get('connection_manager_url')
+        connection_manager_url=device_info.get('connection_manager_url'),
+        udn=device_info.get('udn')
     )
 
 
@@ -214,13 +231,14 @@ def _detect_format_with_ffprobe(stream_url: str) -> str | None:
         logger.info("Attempting format detection with ffprobe")
 
         # Use ffprobe to analyze stream
-        # -analyzeduration and -probesize limit how much data is downloaded
+        # -analyzeduration and -probesize limit how much data is downloaded;
+        # only the first audio stream's codec is printed
         cmd = [
             'ffprobe',
             '-v', 'error',
             '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
+            '-select_streams', 'a:0',
+            '-show_entries', 'stream=codec_name',
             '-analyzeduration', '2000000',  # 2 seconds
             '-probesize', '1000000',  # 1MB
             stream_url
@@ -228,30 +246,23 @@ def _detect_format_with_ffprobe(stream_url: str) -> str | None:
 
         result = subprocess.run(
             cmd,
-            capture_output=True,
-            text=True,
+            capture_output=True,  # Raw bytes - parsed without decoding to str first
             timeout=20
         )
 
         if result.returncode != 0:
-            logger.warning(f"ffprobe failed: {result.stderr}")
+            logger.warning(f"ffprobe failed: {result.stderr.decode('utf-8', 'replace')}")
             return None
 
-        data = json.loads(result.stdout)
+        data = orjson.loads(result.stdout) if orjson is not None else json.loads(result.stdout)
 
-        # Extract codec information
+        # Only the first audio stream was selected
         streams = data.get('streams', [])
         if not streams:
-            logger.warning("ffprobe found no streams")
-            return None
-
-        # Get audio codec from first audio stream
-        audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
-        if not audio_stream:
             logger.warning("ffprobe found no audio streams")
             return None
 
-        codec_name = audio_stream.get('codec_name', '').lower()
+        codec_name = streams[0].get('codec_name', '').lower()
         logger.info(f"ffprobe detected codec: {codec_name}")
 
         # Map codec to MIME type
@@ -379,8 +390,8 @@ def _try_auto_select_default_device():
         client = _create_dlna_client_from_device(device_info)
         capabilities = client.detect_capabilities()
 
-        # Save device with capabilities
-        device_info['capabilities'] = capabilities
+        # Save device with capabilities (device info from cache is read-only)
+        device_info = {**device_info, 'capabilities': capabilities}
         device_manager.select_device(device_info)
 
         # Update global DLNA client
@@ -427,8 +438,7 @@ def _background_device_scan():
             # Add new device if not already in cache
             device_exists = any(d.get('id') == device_info.get('id') for d in cached)
             if not device_exists:
-                cached.append(device_info)
-                device_manager.update_device_cache(cached)
+                device_manager.update_device_cache([*cached, device_info])
                 devices_found_via_callback.append(device_info)
                 logger.info(f"Added device to cache via callback: {device_info.get('friendly_name', 'Unknown')}")
             else:
@@ -452,6 +462,9 @@ def _background_device_scan():
             # Log device names for debugging
             for dev in devices:
                 logger.info(f"  - {dev.get('friendly_name', 'Unknown')} ({dev.get('ip')})")
+
+            # Warm the capabilities cache so selecting any of them skips GetProtocolInfo
+            DLNAClient.detect_many([_create_dlna_client_from_device(dev) for dev in devices])
         else:
             logger.warning("Background scan complete. No devices found - this may indicate network issues")
 
@@ -466,7 +479,7 @@ def initialize():
     """Initialize application components."""
     global config, dlna_client, device_manager, stream_cache, rate_limiter
 
-    config = Config()
+    config = Config.instance()
     logger.info("Configuration loaded")
 
     # Configure HTTP client with connection pooling
@@ -485,6 +498,9 @@ def initialize():
     )
     logger.info(f"Stream format cache initialized (TTL: {config.stream_cache_ttl}s)")
 
+    # Persist detected device capabilities so restarts skip GetProtocolInfo
+    DLNAClient.load_capabilities_cache(os.path.join(config.data_dir, 'capabilities.json'))
+
     # Initialize device manager with data directory
     state_file = os.path.join(config.data_dir, 'state.json')
     device_manager = DeviceManager(state_file=state_file)
@@ -567,7 +583,7 @@ def devices():
             devices_list = device_manager.get_cached_devices()
 
         return jsonify({
-            'devices': devices_list,
+            'devices': [dict(d) for d in devices_list],
             'count': len(devices_list),
             'cache_age_seconds': cache_age
         }), 200
@@ -640,8 +656,8 @@ def device_select():
         logger.info(f"Detecting capabilities for {device_info.get('friendly_name', 'Unknown')}")
         capabilities = client.detect_capabilities()
 
-        # Save device info with capabilities
-        device_info['capabilities'] = capabilities
+        # Save device info with capabilities (device info from cache is read-only)
+        device_info = {**device_info, 'capabilities': capabilities}
         device_manager.select_device(device_info)
 
         # Update global DLNA client
@@ -43,14 +43,12 @@ class StreamFormatCache:
 
     def _load_cache(self):
         """Load cache from disk."""
-        if not self.cache_file.exists():
-            logger.debug("No cache file found, starting with empty cache")
-            return
-
         try:
             with open(self.cache_file, 'r') as f:
                 self.cache = json.load(f)
             logger.info(f"Loaded stream format cache with {len(self.cache)} entries")
+        except FileNotFoundError:
+            logger.debug("No cache file found, starting with empty cache")
         except Exception as e:
             logger.warning(f"Failed to load cache file: {e}")
             self.cache = {}
@@ -1,5 +1,8 @@
 """Pytest configuration and shared fixtures."""
 
+import importlib.util
+import sys
+from unittest.mock import patch
 
 import pytest
 
@@ -32,7 +35,9 @@ def tmp_state_file(tmp_path):
 @pytest.fixture
 def device_manager(tmp_state_file):
     """Create DeviceManager with temporary state file."""
-    return DeviceManager(state_file=tmp_state_file)
+    manager = DeviceManager(state_file=tmp_state_file)
+    yield manager
+    manager.close()
 
 
 @pytest.fixture
@@ -114,3 +119,23 @@ def mock_protocol_info():
         </u:GetProtocolInfoResponse>
     </s:Body>
 </s:Envelope>"""
+
+
+@pytest.fixture
+def fresh_import():
+    """
+    Import a private copy of a module with optional dependencies replaced.
+
+    Call as ``fresh_import('app.device_manager', orjson=None)``: a None value makes
+    ``import orjson`` fail (forcing the fallback), any other value is imported instead
+    of the real package. The copy is not registered in sys.modules, so the module
+    other code and tests use is left untouched.
+    """
+    def load(module_name, **dependencies):
+        spec = importlib.util.find_spec(module_name)
+        module = importlib.util.module_from_spec(spec)
+        with patch.dict(sys.modules, dependencies):
+            spec.loader.exec_module(module)
+        return module
+
+    return load
@@ -0,0 +1,81 @@
+"""Unit tests for Config."""
+
+import os
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from app.config import Config
+from app.http_client import HTTPClient
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    """Write a minimal config file."""
+    path = tmp_path / 'config.yaml'
+    path.write_text('streaming:\n  mp3_bitrate: 192k\n')
+    return path
+
+
+class TestDefaults:
+    """Test defaults used when settings are missing from the config file."""
+
+    def test_connection_pool_defaults(self, tmp_path):
+        """Pool sizes should default to 16/32, matching the HTTP client's own defaults."""
+        config = Config(str(tmp_path / 'missing.yaml'))
+
+        assert (config.connection_pool_size, config.connection_pool_maxsize) == (16, 32)
+        assert HTTPClient._pool_sizes == (16, 32)
+
+
+class TestYamlCache:
+    """Test reuse of parsed YAML between Config instances."""
+
+    def test_unchanged_file_parsed_once(self, config_file):
+        """A second Config for an unchanged file should reuse the parsed YAML."""
+        with patch('app.config.yaml.load', wraps=yaml.load) as mock_load:
+            Config(str(config_file))
+            config = Config(str(config_file))
+
+        assert mock_load.call_count == 1
+        assert config.mp3_bitrate == '192k'
+
+    def test_modified_file_reparsed(self, config_file):
+        """A change to the file's mtime should invalidate the cached YAML."""
+        Config(str(config_file))
+        config_file.write_text('streaming:\n  mp3_bitrate: 320k\n')
+        stat = os.stat(config_file)
+        os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert Config(str(config_file)).mp3_bitrate == '320k'
+
+    def test_instances_do_not_share_data(self, config_file):
+        """Mutating one Config's data must not leak into the cache or other instances."""
+        first = Config(str(config_file))
+        first.data['streaming']['mp3_bitrate'] = '64k'
+
+        assert Config(str(config_file)).mp3_bitrate == '192k'
+
+
+class TestSharedInstance:
+    """Test the process-wide Config.instance() accessor."""
+
+    @pytest.fixture(autouse=True)
+    def reset_instance(self, monkeypatch):
+        """Start each test without a shared instance."""
+        monkeypatch.setattr(Config, '_instance', None)
+
+    def test_returns_same_instance(self, config_file):
+        """Repeated calls with the same path should return the loaded instance."""
+        config = Config.instance(str(config_file))
+
+        assert Config.instance(str(config_file)) is config
+        assert config.mp3_bitrate == '192k'
+
+    def test_rejects_different_path(self, config_file, tmp_path):
+        """A call with another path must fail instead of silently ignoring it."""
+        Config.instance(str(config_file))
+
+        with pytest.raises(ValueError):
+            Config.instance(str(tmp_path / 'other.yaml'))
@@ -1,7 +1,11 @@
 """Unit tests for DeviceManager."""
 
 import json
+import threading
 import time
+from unittest.mock import Mock, patch
+
+import pytest
 
 from app.device_manager import DeviceManager
 
@@ -13,7 +17,7 @@ class TestDeviceManager:
         """Initialize with no state file."""
         dm = DeviceManager(state_file=tmp_state_file)
         assert dm.current_device is None
-        assert dm.cached_devices == []
+        assert dm.cached_devices == ()
         assert dm.last_scan_time is None
 
     def test_select_device_saves_to_disk(self, device_manager, sample_device, tmp_state_file):
@@ -24,24 +28,24 @@ class TestDeviceManager:
         assert device_manager.current_device == sample_device
 
         # Verify saved to disk
+        device_manager.flush()
         with open(tmp_state_file) as f:
             data = json.load(f)
             assert data['current_device']['id'] == sample_device['id']
             assert data['current_device']['friendly_name'] == sample_device['friendly_name']
 
-    def test_get_current_device_returns_copy(self, device_manager, sample_device):
-        """get_current_device returns copy, not reference."""
+    def test_get_current_device_is_read_only(self, device_manager, sample_device):
+        """get_current_device returns a read-only view isolated from the caller's dict."""
         device_manager.select_device(sample_device)
 
-        device1 = device_manager.get_current_device()
-        device2 = device_manager.get_current_device()
+        device = device_manager.get_current_device()
 
-        # Modify copy
-        device1['friendly_name'] = 'Modified'
+        with pytest.raises(TypeError):
+            device['friendly_name'] = 'Modified'
 
-        # Original should be unchanged
-        assert device2['friendly_name'] == 'Test Device'
-        assert device_manager.current_device['friendly_name'] == 'Test Device'
+        # Mutating the dict passed to select_device doesn't leak into stored state
+        sample_device['friendly_name'] = 'Modified'
+        assert device_manager.get_current_device()['friendly_name'] == 'Test Device'
 
     def test_clear_device(self, device_manager, sample_device, tmp_state_file):
         """Clear device removes it from state."""
@@ -52,6 +56,7 @@ class TestDeviceManager:
         assert device_manager.get_current_device() is None
 
         # Verify saved to disk
+        device_manager.flush()
         with open(tmp_state_file) as f:
             data = json.load(f)
             assert data['current_device'] is None
@@ -128,6 +133,7 @@ class TestDeviceManager:
         # Worker 1 selects device
         dm1 = DeviceManager(state_file=tmp_state_file)
         dm1.select_device(sample_device)
+        dm1.flush()
 
         # Worker 2 reads state (simulates different process)
         dm2 = DeviceManager(state_file=tmp_state_file)
@@ -135,3 +141,124 @@ class TestDeviceManager:
 
         assert device is not None
         assert device['id'] == sample_device['id']
+
+    def test_reload_skips_parse_when_state_file_unchanged(self, tmp_state_file, sample_device):
+        """Unchanged state file is not re-parsed; a write from another worker is picked up."""
+        dm1 = DeviceManager(state_file=tmp_state_file)
+        dm1.select_device(sample_device)
+        dm1.flush()
+
+        dm2 = DeviceManager(state_file=tmp_state_file)
+        with patch('app.device_manager._loads') as mock_load:
+            assert dm2.get_current_device()['id'] == sample_device['id']
+            mock_load.assert_not_called()
+
+        dm1.select_device({**sample_device, 'id': 'uuid:other'})
+        dm1.flush()
+        assert dm2.get_current_device()['id'] == 'uuid:other'
+
+    def test_mutations_are_coalesced_into_one_write(self, tmp_state_file, sample_device):
+        """Rapid mutations are written by the background writer in a single save."""
+        dm = DeviceManager(state_file=tmp_state_file, save_delay=0.05)
+
+        with patch.object(DeviceManager, '_save_state', autospec=True,
+                          side_effect=DeviceManager._save_state) as mock_save:
+            dm.update_device_cache([sample_device])
+            dm.select_device(sample_device)
+            dm.clear_device()
+            assert mock_save.call_count == 0  # Nothing written on the request thread
+
+            deadline = time.time() + 2
+            while dm._dirty.is_set() and time.time() < deadline:
+                time.sleep(0.01)
+            with dm.lock:  # Wait for the writer to finish the save it started
+                pass
+
+            assert mock_save.call_count == 1
+
+        with open(tmp_state_file) as f:
+            data = json.load(f)
+        assert data['current_device'] is None
+        assert len(data['cached_devices']) == 1
+        dm.close()
+
+    def test_close_writes_pending_changes_and_stops_writer(self, tmp_state_file, sample_device):
+        """close() should persist without waiting for save_delay and end the writer thread."""
+        dm = DeviceManager(state_file=tmp_state_file, save_delay=10)
+        dm.select_device(sample_device)
+        writer = dm._writer
+        assert writer.is_alive()
+
+        dm.close()
+
+        assert not writer.is_alive()
+        with open(tmp_state_file) as f:
+            assert json.load(f)['current_device']['id'] == sample_device['id']
+
+    def test_mutations_after_close_write_synchronously(self, tmp_state_file, sample_device):
+        """A closed manager should keep persisting changes, without starting a new writer."""
+        dm = DeviceManager(state_file=tmp_state_file, save_delay=10)
+        dm.close()
+
+        dm.select_device(sample_device)
+
+        assert dm._writer is None
+        with open(tmp_state_file) as f:
+            assert json.load(f)['current_device']['id'] == sample_device['id']
+
+    def test_closed_instances_do_not_leak(self, tmp_state_file, sample_device):
+        """Each closed manager should release its writer thread and exit hook."""
+        def writers():
+            return sum(t.name == 'device-state-writer' for t in threading.enumerate())
+
+        before = writers()
+        with patch('app.device_manager.atexit') as mock_atexit:
+            for _ in range(2):
+                dm = DeviceManager(state_file=tmp_state_file, save_delay=0.05)
+                dm.select_device(sample_device)
+                assert writers() == before + 1
+                dm.close()
+                # The exit hook holding a reference to the manager is removed again
+                mock_atexit.unregister.assert_called_with(mock_atexit.register.call_args.args[0])
+
+        assert writers() == before
+        assert mock_atexit.register.call_count == mock_atexit.unregister.call_count == 2
+
+    def test_save_delay_zero_writes_synchronously(self, tmp_state_file, sample_device):
+        """save_delay=0 persists on the calling thread without a writer thread."""
+        dm = DeviceManager(state_file=tmp_state_file, save_delay=0)
+        dm.select_device(sample_device)
+
+        with open(tmp_state_file) as f:
+            assert json.load(f)['current_device']['id'] == sample_device['id']
+
+
+class TestOptionalOrjson:
+    """Test state serialization with and without the optional orjson package."""
+
+    def test_falls_back_to_json_without_orjson(self, fresh_import, tmp_state_file, sample_device):
+        """Without orjson, state should be written and read with the stdlib json module."""
+        device_manager = fresh_import('app.device_manager', orjson=None)
+        assert device_manager.orjson is None
+
+        dm = device_manager.DeviceManager(state_file=tmp_state_file, save_delay=0)
+        dm.select_device(sample_device)
+
+        with open(tmp_state_file) as f:
+            assert json.load(f)['current_device'] == sample_device
+        reloaded = device_manager.DeviceManager(state_file=tmp_state_file, save_delay=0)
+        assert reloaded.current_device == sample_device
+
+    def test_uses_orjson_when_installed(self, fresh_import):
+        """With orjson installed, it should do the encoding and decoding."""
+        fake_orjson = Mock(OPT_INDENT_2=2)
+        fake_orjson.dumps.return_value = b'{}'
+        fake_orjson.loads.return_value = {'current_device': None}
+        device_manager = fresh_import('app.device_manager', orjson=fake_orjson)
+
+        assert device_manager._dumps({'current_device': None}) == b'{}'
+        fake_orjson.dumps.assert_called_once_with({'current_device': None}, option=2)
+
+        raw = memoryview(b'{"current_device": null}')
+        assert device_manager._loads(raw) == {'current_device': None}
+        fake_orjson.loads.assert_called_once_with(raw)
@@ -0,0 +1,535 @@
+"""Unit tests for SSDP discovery and device description fetching."""
+
+import socket
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock, patch
+from xml.etree import ElementTree
+
+import pytest
+import requests
+
+from app import discovery
+from app.discovery import SSDPDiscovery
+from app.http_client import HTTPClient
+
+DESCRIPTION = b'''<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+    <device>
+        <deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType>
+        <friendlyName>Living Room</friendlyName>
+        <manufacturer>Panasonic</manufacturer>
+        <modelName>SC-PMX9</modelName>
+        <UDN>uuid:4d696e69-444c-164e-9d41-b827eb54e1a1</UDN>
+        <serviceList>
+            <service>
+                <serviceType>urn:schemas-upnp-org:service:ConnectionManager:1</serviceType>
+                <controlURL>/ConnectionManager/control</controlURL>
+            </service>
+            <service>
+                <serviceType>urn:schemas-upnp-org:service:AVTransport:1</serviceType>
+                <controlURL>AVTransport/control</controlURL>
+            </service>
+        </serviceList>
+    </device>
+</root>'''
+
+
+def fake_response(status_code=200, body=b'', headers=None):
+    """Build a streamed response mock that can be used as a context manager."""
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {'Content-Type': 'text/xml'} if headers is None else headers
+    response.iter_content.side_effect = lambda chunk_size=1: (
+        body[i:i + chunk_size] for i in range(0, len(body), chunk_size)
+    )
+    response.__enter__.return_value = response
+    return response
+
+
+def ssdp_response(location: str, usn: str) -> bytes:
+    """Build a raw M-SEARCH response datagram."""
+    return (
+        'HTTP/1.1 200 OK\r\n'
+        'CACHE-CONTROL: max-age=1800\r\n'
+        f'LOCATION: {location}\r\n'
+        'ST: urn:schemas-upnp-org:device:MediaRenderer:1\r\n'
+        f'USN: {usn}\r\n'
+        '\r\n'
+    ).encode()
+
+
+# socket.socket is patched to FakeSSDPSocket while discover() runs
+_RealSocket = socket.socket
+
+
+class FakeSSDPSocket(_RealSocket):
+    """
+    Real UDP socket that records M-SEARCH requests instead of multicasting them.
+
+    The first M-SEARCH is "answered" by sending ``responses`` to the socket over
+    loopback, so they are all queued when the receive loop drains them.
+    """
+
+    instances: list['FakeSSDPSocket'] = []
+    responses: list[bytes] = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bound_to = None
+        self.msearches = []
+        self.instances.append(self)
+
+    def bind(self, address):
+        self.bound_to = address
+        super().bind(('127.0.0.1', address[1]))
+
+    def sendto(self, data, address):
+        self.msearches.append((data, address))
+        if len(self.msearches) == 1:
+            with _RealSocket(socket.AF_INET, socket.SOCK_DGRAM) as device:
+                for response in self.responses:
+                    device.sendto(response, self.getsockname())
+        return len(data)
+
+
+@pytest.fixture
+def fake_ssdp_socket():
+    """Route discover()'s socket through FakeSSDPSocket."""
+    FakeSSDPSocket.instances = []
+    FakeSSDPSocket.responses = []
+    with patch('app.discovery.socket.socket', FakeSSDPSocket), \
+            patch.object(SSDPDiscovery, '_multicast_interfaces', return_value=[None]):
+        yield FakeSSDPSocket
+
+
+@pytest.fixture(autouse=True)
+def empty_description_cache():
+    """Isolate tests from descriptions cached by other tests."""
+    discovery._description_cache.clear()
+    yield
+    discovery._description_cache.clear()
+
+
+class TestProbeLocation:
+    """Test direct-connection probing of candidate description URLs."""
+
+    LOCATION = 'http://192.168.1.100:8080/description.xml'
+
+    def test_head_success_fetches_description(self):
+        """A device answering HEAD with XML should have its description fetched once."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.head.return_value = fake_response()
+            mock_http.get.return_value = fake_response(body=DESCRIPTION)
+
+            device = SSDPDiscovery._probe_location(self.LOCATION, timeout=5)
+
+        assert device['friendly_name'] == 'Living Room'
+        assert mock_http.get.call_count == 1
+
+    def test_head_follows_redirects(self):
+        """Devices that redirect the description URL should still be found."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.head.return_value = fake_response()
+            mock_http.get.return_value = fake_response(body=DESCRIPTION)
+
+            assert SSDPDiscovery._probe_location(self.LOCATION, timeout=5)
+
+        assert mock_http.head.call_args.kwargs['allow_redirects'] is True
+
+    def test_head_without_content_type_sniffs_body(self):
+        """A 200 HEAD without Content-Type should go on to fetch and sniff the body."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.head.return_value = fake_response(headers={})
+            mock_http.get.return_value = fake_response(body=DESCRIPTION, headers={})
+
+            device = SSDPDiscovery._probe_location(self.LOCATION, timeout=5)
+
+        assert device['friendly_name'] == 'Living Room'
+
+    def test_head_without_content_type_non_xml_body_is_skipped(self):
+        """Sniffing should still reject a body that isn't XML."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.head.return_value = fake_response(headers={})
+            mock_http.get.return_value = fake_response(body=b'Not Found', headers={})
+
+            assert SSDPDiscovery._probe_location(self.LOCATION, timeout=5) is None
+
+    def test_head_with_html_content_type_is_skipped(self):
+        """A declared non-XML Content-Type should not be fetched at all."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.head.return_value = fake_response(headers={'Content-Type': 'text/html'})
+
+            assert SSDPDiscovery._probe_location(self.LOCATION, timeout=5) is None
+            mock_http.get.assert_not_called()
+
+    @pytest.mark.parametrize("status", [405, 501])
+    def test_head_not_supported_reuses_get_body(self, status):
+        """When HEAD isn't supported, the fallback GET body should be parsed instead of fetched again."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.head.return_value = fake_response(status_code=status)
+            mock_http.get.return_value = fake_response(body=DESCRIPTION)
+
+            device = SSDPDiscovery._probe_location(self.LOCATION, timeout=5)
+
+        assert device['control_url'] == 'http://192.168.1.100:8080/AVTransport/control'
+        assert mock_http.get.call_count == 1
+        assert mock_http.get.call_args.kwargs['stream'] is True
+
+    def test_head_not_supported_fallback_is_size_capped(self):
+        """The fallback GET must stop reading at the description size cap."""
+        response = fake_response()
+        read = []
+
+        def endless_body(chunk_size=1):
+            while True:
+                read.append(chunk_size)
+                yield b' ' * chunk_size
+
+        response.iter_content.side_effect = endless_body
+
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.head.return_value = fake_response(status_code=405)
+            mock_http.get.return_value = response
+
+            assert SSDPDiscovery._probe_location(self.LOCATION, timeout=5) is None
+
+        assert discovery._MAX_DESCRIPTION_SIZE < sum(read) <= discovery._MAX_DESCRIPTION_SIZE + read[0]
+
+    def test_head_not_supported_non_xml_is_skipped(self):
+        """A fallback GET returning HTML should not be parsed."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.head.return_value = fake_response(status_code=405)
+            mock_http.get.return_value = fake_response(body=b'<html></html>', headers={'Content-Type': 'text/html'})
+
+            assert SSDPDiscovery._probe_location(self.LOCATION, timeout=5) is None
+            mock_http.get.return_value.iter_content.assert_not_called()
+
+
+class TestDiscover:
+    """Test the SSDP M-SEARCH receive loop."""
+
+    def _device(self, location):
+        return {'friendly_name': location.rsplit('/', 1)[1], 'location': location}
+
+    def test_drains_all_queued_responses(self, fake_ssdp_socket):
+        """A burst of responses queued on the socket should all be collected."""
+        fake_ssdp_socket.responses = [
+            ssdp_response(f'http://192.168.1.{10 + i}:8080/d{i}', f'uuid:device-{i}::upnp:rootdevice')
+            for i in range(8)
+        ]
+
+        with patch.object(SSDPDiscovery, '_fetch_device_info', side_effect=self._device) as mock_fetch:
+            devices = SSDPDiscovery.discover(timeout=0.3)
+
+        assert mock_fetch.call_count == 8
+        assert sorted(d['friendly_name'] for d in devices) == [f'd{i}' for i in range(8)]
+
+    def test_deduplicates_by_location_and_usn(self, fake_ssdp_socket):
+        """Each device should be fetched once, even when it answers twice or at several LOCATIONs."""
+        fake_ssdp_socket.responses = [
+            ssdp_response('http://192.168.1.10:8080/a', 'uuid:device-a::urn:schemas-upnp-org:device:MediaRenderer:1'),
+            ssdp_response('http://192.168.1.10:8080/a', 'uuid:device-a::urn:schemas-upnp-org:device:MediaRenderer:1'),
+            # Same device announced at a second LOCATION
+            ssdp_response('http://192.168.1.10:49152/a2', 'uuid:device-a::upnp:rootdevice'),
+            ssdp_response('http://192.168.1.11:8080/b', 'uuid:device-b::urn:schemas-upnp-org:device:MediaRenderer:1'),
+        ]
+
+        with patch.object(SSDPDiscovery, '_fetch_device_info', side_effect=self._device) as mock_fetch:
+            devices = SSDPDiscovery.discover(timeout=0.3)
+
+        fetched = sorted(call.args[0] for call in mock_fetch.call_args_list)
+        assert fetched == ['http://192.168.1.10:8080/a', 'http://192.168.1.11:8080/b']
+        assert sorted(d['friendly_name'] for d in devices) == ['a', 'b']
+
+    def test_binds_ephemeral_port(self, fake_ssdp_socket):
+        """The reply socket should bind an ephemeral port instead of sharing 1900."""
+        SSDPDiscovery.discover(timeout=0.3)
+
+        sock, = fake_ssdp_socket.instances
+        assert sock.bound_to == ('', 0)
+
+    def test_repeats_msearch_from_receive_loop(self, fake_ssdp_socket):
+        """M-SEARCH should go out twice, the repeat sent while responses are being received."""
+        with patch('app.discovery.time.sleep') as mock_sleep:
+            SSDPDiscovery.discover(timeout=0.3)
+
+        mock_sleep.assert_not_called()
+        sock, = fake_ssdp_socket.instances
+        assert [address for _, address in sock.msearches] == [('239.255.255.250', 1900)] * 2
+        assert b'ST: urn:schemas-upnp-org:device:MediaRenderer:1' in sock.msearches[0][0]
+
+    def test_socket_closed_after_discovery(self, fake_ssdp_socket):
+        """The SSDP socket should be closed once responses are collected."""
+        SSDPDiscovery.discover(timeout=0.3)
+
+        assert fake_ssdp_socket.instances[0].fileno() == -1
+
+    def test_socket_closed_when_receive_loop_fails(self, fake_ssdp_socket):
+        """Errors in the receive loop must not leak the socket."""
+        with patch('app.discovery.selectors.DefaultSelector', side_effect=OSError("epoll failed")):
+            assert SSDPDiscovery.discover(timeout=0.3) == []
+
+        assert fake_ssdp_socket.instances[0].fileno() == -1
+
+
+    def test_device_callback_receives_each_device(self, fake_ssdp_socket):
+        """The callback should have seen every device by the time discover() returns."""
+        fake_ssdp_socket.responses = [
+            ssdp_response('http://192.168.1.10:8080/a', 'uuid:device-a::upnp:rootdevice'),
+            ssdp_response('http://192.168.1.11:8080/b', 'uuid:device-b::upnp:rootdevice'),
+        ]
+        seen = []
+
+        with patch.object(SSDPDiscovery, '_fetch_device_info', side_effect=self._device):
+            SSDPDiscovery.discover(timeout=0.3, device_callback=seen.append)
+
+        assert sorted(d['friendly_name'] for d in seen) == ['a', 'b']
+
+    def test_failing_callback_does_not_stop_delivery(self, fake_ssdp_socket):
+        """A callback error for one device should not keep the others from being delivered or returned."""
+        fake_ssdp_socket.responses = [
+            ssdp_response('http://192.168.1.10:8080/a', 'uuid:device-a::upnp:rootdevice'),
+            ssdp_response('http://192.168.1.11:8080/b', 'uuid:device-b::upnp:rootdevice'),
+        ]
+        seen = []
+
+        def callback(device_info):
+            seen.append(device_info['friendly_name'])
+            raise RuntimeError("cache update failed")
+
+        with patch.object(SSDPDiscovery, '_fetch_device_info', side_effect=self._device):
+            devices = SSDPDiscovery.discover(timeout=0.3, device_callback=callback)
+
+        assert sorted(seen) == ['a', 'b']
+        assert len(devices) == 2
+
+class TestMulticastInterfaces:
+    """Test per-interface M-SEARCH."""
+
+    def test_lists_routable_ipv4_addresses(self):
+        """Loopback, link-local and non-IPv4 addresses should be skipped."""
+        fake_psutil = Mock()
+        fake_psutil.net_if_addrs.return_value = {
+            'lo': [SimpleNamespace(family=socket.AF_INET, address='127.0.0.1')],
+            'eth0': [
+                SimpleNamespace(family=socket.AF_INET, address='192.168.1.5'),
+                SimpleNamespace(family=socket.AF_INET6, address='fe80::1'),
+            ],
+            'wlan0': [SimpleNamespace(family=socket.AF_INET, address='169.254.3.4')],
+            'docker0': [SimpleNamespace(family=socket.AF_INET, address='172.17.0.1')],
+        }
+
+        with patch('app.discovery.psutil', fake_psutil):
+            assert SSDPDiscovery._multicast_interfaces() == ['192.168.1.5', '172.17.0.1']
+
+    def test_enumeration_failure_falls_back_to_default_interface(self):
+        """If interfaces can't be listed, M-SEARCH should still go out the default interface."""
+        fake_psutil = Mock()
+        fake_psutil.net_if_addrs.side_effect = OSError("Permission denied")
+
+        with patch('app.discovery.psutil', fake_psutil):
+            assert SSDPDiscovery._multicast_interfaces() == [None]
+
+    def test_sends_msearch_on_each_interface(self):
+        """Each interface should get its own M-SEARCH, and a failing one shouldn't stop the rest."""
+        sock = Mock()
+        sock.setsockopt.side_effect = [OSError("Cannot assign requested address"), None]
+
+        SSDPDiscovery._send_msearch(sock, ['10.0.0.5', '192.168.1.5'])
+
+        assert [c.args[2] for c in sock.setsockopt.call_args_list] == [
+            socket.inet_aton('10.0.0.5'), socket.inet_aton('192.168.1.5')
+        ]
+        sock.sendto.assert_called_once_with(SSDPDiscovery._MSEARCH_MSG, ('239.255.255.250', 1900))
+
+
+class TestFetchDeviceInfo:
+    """Test device description download, parsing and revalidation."""
+
+    LOCATION = 'http://192.168.1.100:8080/description.xml'
+
+    def test_parses_description(self):
+        """A MediaRenderer description should be turned into device info."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.get.return_value = fake_response(body=DESCRIPTION)
+
+            device = SSDPDiscovery._fetch_device_info(self.LOCATION)
+
+        assert device == {
+            'id': '4d696e69-444c-164e-9d41-b827eb54e1a1',
+            'friendly_name': 'Living Room',
+            'manufacturer': 'Panasonic',
+            'model_name': 'SC-PMX9',
+            'ip': '192.168.1.100',
+            'port': 8080,
+            'location': self.LOCATION,
+            'control_url': 'http://192.168.1.100:8080/AVTransport/control',
+            'connection_manager_url': 'http://192.168.1.100:8080/ConnectionManager/control',
+            'udn': 'uuid:4d696e69-444c-164e-9d41-b827eb54e1a1',
+        }
+
+    def test_missing_connection_manager_uses_default_url(self):
+        """Without a ConnectionManager service, its common default control URL should be used."""
+        body = DESCRIPTION.replace(b'ConnectionManager:1', b'RenderingControl:1')
+
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.get.return_value = fake_response(body=body)
+
+            device = SSDPDiscovery._fetch_device_info(self.LOCATION)
+
+        assert device['connection_manager_url'] == 'http://192.168.1.100:8080/ConnectionManager/ctrl'
+
+    def test_media_server_is_filtered_out(self):
+        """Devices without AVTransport can't play media and should be skipped."""
+        body = DESCRIPTION.replace(b'AVTransport', b'ContentDirectory')
+
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.get.return_value = fake_response(body=body)
+
+            assert SSDPDiscovery._fetch_device_info(self.LOCATION) is None
+
+    def test_oversized_description_is_rejected(self):
+        """Descriptions over the size cap should be dropped without parsing."""
+        body = DESCRIPTION + b' ' * discovery._MAX_DESCRIPTION_SIZE
+
+        with patch('app.discovery.http_client') as mock_http, \
+                patch.object(SSDPDiscovery, '_parse_device_description') as mock_parse:
+            mock_http.get.return_value = fake_response(body=body)
+
+            assert SSDPDiscovery._fetch_device_info(self.LOCATION) is None
+            mock_parse.assert_not_called()
+        assert mock_http.get.call_args.kwargs['stream'] is True
+
+    @pytest.mark.parametrize("body, headers", [
+        (b'<html><body>Login</body></html>', {'Content-Type': 'text/html'}),
+        (b'{"device": "not xml"}', {}),
+    ])
+    def test_non_xml_description_is_rejected(self, body, headers):
+        """Captive portals and other non-XML replies should not reach the parser."""
+        with patch('app.discovery.http_client') as mock_http, \
+                patch.object(SSDPDiscovery, '_parse_device_description') as mock_parse:
+            mock_http.get.return_value = fake_response(body=body, headers=headers)
+
+            assert SSDPDiscovery._fetch_device_info(self.LOCATION) is None
+            mock_parse.assert_not_called()
+
+    def test_description_without_content_type_is_parsed(self):
+        """A missing Content-Type shouldn't reject a body that is XML."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.get.return_value = fake_response(body=DESCRIPTION, headers={})
+
+            assert SSDPDiscovery._fetch_device_info(self.LOCATION)['friendly_name'] == 'Living Room'
+
+    @pytest.mark.parametrize("validator, request_header", [
+        ({'ETag': '"v1"'}, 'If-None-Match'),
+        ({'Last-Modified': 'Wed, 21 Oct 2025 07:28:00 GMT'}, 'If-Modified-Since'),
+    ])
+    def test_revalidates_cached_description(self, validator, request_header):
+        """A cached description should be revalidated and reused on 304 Not Modified."""
+        headers = {'Content-Type': 'text/xml', **validator}
+
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.get.return_value = fake_response(body=DESCRIPTION, headers=headers)
+            first = SSDPDiscovery._fetch_device_info(self.LOCATION)
+            assert mock_http.get.call_args.kwargs['headers'] == {}
+
+            mock_http.get.return_value = fake_response(status_code=304, headers={})
+            second = SSDPDiscovery._fetch_device_info(self.LOCATION)
+
+        assert mock_http.get.call_args.kwargs['headers'] == {request_header: next(iter(validator.values()))}
+        assert second == first
+
+    def test_description_without_validators_is_not_cached(self):
+        """Descriptions that can't be revalidated should be downloaded every time."""
+        with patch('app.discovery.http_client') as mock_http:
+            mock_http.get.return_value = fake_response(body=DESCRIPTION)
+            SSDPDiscovery._fetch_device_info(self.LOCATION)
+
+        assert self.LOCATION not in discovery._description_cache
+
+
+class TestDirectConnection:
+    """Test direct connection to a device by host."""
+
+    def test_probes_candidates_in_parallel(self):
+        """All port/path candidates should be probed concurrently, returning the device found."""
+        device = {'friendly_name': 'Living Room'}
+        found_at = 'http://192.168.1.100:80/AVTransport/ctrl'  # Last candidate
+
+        def probe(location, timeout):
+            time.sleep(0.05)
+            return device if location == found_at else None
+
+        with patch.object(SSDPDiscovery, '_probe_location', side_effect=probe) as mock_probe:
+            started = time.monotonic()
+            assert SSDPDiscovery.try_direct_connection('192.168.1.100') == device
+            elapsed = time.monotonic() - started
+
+        assert mock_probe.call_count == 30  # 6 ports x 5 paths
+        assert elapsed < 0.5  # Sequential probing would take 1.5s
+
+    def test_returns_none_when_nothing_answers(self):
+        """No candidate serving a description means no device."""
+        with patch.object(SSDPDiscovery, '_probe_location', return_value=None):
+            assert SSDPDiscovery.try_direct_connection('192.168.1.100') is None
+
+
+    def test_offline_host_does_not_open_circuit(self):
+        """Failed probes shouldn't block the device requests that follow a direct connection."""
+        client = object.__new__(HTTPClient)
+        HTTPClient.__init__(client)
+        session = Mock()
+        session.head.side_effect = requests.ConnectionError("Connection refused")
+
+        with patch('app.discovery.http_client', client), patch.object(client, '_get_session', return_value=session):
+            assert SSDPDiscovery.try_direct_connection('192.168.1.100', timeout=5) is None
+            assert session.head.call_count == 30
+
+            session.post.return_value = Mock(status_code=200)
+            client.post('http://192.168.1.100:8080/AVTransport/ctrl', data={'a': 'b'}, fail_fast=True)
+
+        assert client._breakers == {}
+        assert session.head.call_args.kwargs['timeout'] == pytest.approx((2.0, 5), abs=0.05)  # Connect capped
+
+class TestOptionalDependencies:
+    """Test discovery with and without its optional packages."""
+
+    LOCATION = 'http://192.168.1.100:8080/description.xml'
+
+    def test_parses_with_stdlib_without_lxml(self, fresh_import):
+        """Without lxml, descriptions should be parsed by xml.etree."""
+        fresh = fresh_import('app.discovery', lxml=None)
+
+        assert fresh.ET is ElementTree
+        assert fresh._xml_parser is None
+        device = fresh.SSDPDiscovery._parse_device_description(self.LOCATION, DESCRIPTION)
+        assert device['friendly_name'] == 'Living Room'
+
+    def test_parses_with_lxml_when_installed(self, fresh_import):
+        """With lxml, a parser that never resolves entities or fetches DTDs should be used."""
+        fake_etree = SimpleNamespace(XMLParser=Mock(return_value=None), fromstring=Mock(wraps=ElementTree.fromstring))
+        fresh = fresh_import('app.discovery', lxml=SimpleNamespace(etree=fake_etree))
+
+        device = fresh.SSDPDiscovery._parse_device_description(self.LOCATION, DESCRIPTION)
+
+        fake_etree.XMLParser.assert_called_once_with(resolve_entities=False, no_network=True)
+        fake_etree.fromstring.assert_called_once_with(DESCRIPTION, None)
+        assert device['friendly_name'] == 'Living Room'
+
+    def test_default_interface_without_psutil(self, fresh_import):
+        """Without psutil, M-SEARCH should go out the default interface only."""
+        fresh = fresh_import('app.discovery', psutil=None)
+
+        assert fresh.psutil is None
+        assert fresh.SSDPDiscovery._multicast_interfaces() == [None]
+
+    def test_enumerates_interfaces_with_psutil(self, fresh_import):
+        """With psutil installed, every routable IPv4 interface should be used."""
+        fake_psutil = Mock()
+        fake_psutil.net_if_addrs.return_value = {
+            'eth0': [SimpleNamespace(family=socket.AF_INET, address='192.168.1.5')],
+        }
+        fresh = fresh_import('app.discovery', psutil=fake_psutil)
+
+        assert fresh.SSDPDiscovery._multicast_interfaces() == ['192.168.1.5']
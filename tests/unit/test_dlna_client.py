@@ -1,11 +1,24 @@
 """Unit tests for DLNAClient."""
 
+from datetime import timedelta
+from types import SimpleNamespace
+from xml.etree import ElementTree
+
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 
 from app.dlna_client import DLNAClient
 
 
+class SOAPResponse(Mock):
+    """Mock HTTP response whose streamed body is its ``text``."""
+
+    encoding = 'utf-8'
+
+    def iter_content(self, chunk_size=1):
+        yield self.text.encode('utf-8')
+
+
 class TestDLNAClientExceptionHandling:
     """Test exception handling in SOAP requests."""
 
@@ -50,7 +63,7 @@ class TestDLNAClientExceptionHandling:
 
     def test_send_soap_request_success(self, client):
         """SOAP request should return response text on success."""
-        mock_response = Mock()
+        mock_response = SOAPResponse()
         mock_response.status_code = 200
         mock_response.text = '<response>OK</response>'
 
@@ -63,7 +76,7 @@ class TestDLNAClientExceptionHandling:
 
     def test_send_soap_request_handles_http_error(self, client):
         """SOAP request should return None on HTTP error status."""
-        mock_response = Mock()
+        mock_response = SOAPResponse()
         mock_response.status_code = 500
         mock_response.text = '<error>Internal Server Error</error>'
 
@@ -78,6 +91,13 @@ class TestDLNAClientExceptionHandling:
 class TestCapabilitiesDetection:
     """Test device capabilities detection."""
 
+    @pytest.fixture(autouse=True)
+    def clear_capabilities_cache(self):
+        """Isolate tests from capabilities cached by other clients."""
+        DLNAClient.invalidate_capabilities_cache()
+        yield
+        DLNAClient.invalidate_capabilities_cache()
+
     @pytest.fixture
     def client(self):
         """Create a DLNAClient instance."""
@@ -88,7 +108,7 @@ class TestCapabilitiesDetection:
 
     def test_detect_capabilities_parses_mp3_support(self, client):
         """Should detect MP3 support from protocol info."""
-        mock_response = Mock()
+        mock_response = SOAPResponse()
         mock_response.status_code = 200
         mock_response.text = '''<?xml version="1.0"?>
         <root>
@@ -105,7 +125,7 @@ class TestCapabilitiesDetection:
 
     def test_detect_capabilities_parses_aac_support(self, client):
         """Should detect AAC support from protocol info."""
-        mock_response = Mock()
+        mock_response = SOAPResponse()
         mock_response.status_code = 200
         mock_response.text = '''<?xml version="1.0"?>
         <root>
@@ -120,6 +140,146 @@ class TestCapabilitiesDetection:
             assert caps['supports_mp3'] is False
             assert caps['supports_aac'] is True
 
+    def test_detect_capabilities_cached_across_clients(self, client):
+        """A second client for the same device should reuse detected capabilities."""
+        mock_response = SOAPResponse()
+        mock_response.status_code = 200
+        mock_response.text = '<root><Sink>http-get:*:audio/flac:*</Sink></root>'
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.return_value = mock_response
+
+            client.detect_capabilities()
+            caps = DLNAClient(device_host="192.168.1.100", device_port=55000).detect_capabilities()
+            assert caps['supports_flac'] is True
+            assert mock_http.post.call_count == 1
+
+            DLNAClient.invalidate_capabilities_cache("192.168.1.100", 55000)
+            client.detect_capabilities()
+            assert mock_http.post.call_count == 2
+
+    def test_detect_capabilities_keyed_by_udn(self):
+        """A different renderer reusing a host:port (e.g. after DHCP) must not get the old device's capabilities."""
+        flac = SOAPResponse(status_code=200, text='<root><Sink>http-get:*:audio/flac:*</Sink></root>')
+        mp3 = SOAPResponse(status_code=200, text='<root><Sink>http-get:*:audio/mpeg:*</Sink></root>')
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.side_effect = [flac, mp3]
+
+            old = DLNAClient(device_host="192.168.1.100", device_port=55000, udn="uuid:old-renderer")
+            new = DLNAClient(device_host="192.168.1.100", device_port=55000, udn="uuid:new-renderer")
+            assert old.detect_capabilities()['supports_flac'] is True
+            caps = new.detect_capabilities()
+
+            assert caps['supports_flac'] is False
+            assert caps['supports_mp3'] is True
+            assert mock_http.post.call_count == 2
+
+            # Same UDN at a new address still hits the cache
+            moved = DLNAClient(device_host="192.168.1.101", device_port=55000, udn="uuid:old-renderer")
+            assert moved.detect_capabilities()['supports_flac'] is True
+            assert mock_http.post.call_count == 2
+
+    def test_invalidate_capabilities_cache_by_udn(self):
+        """Invalidating one UDN should leave other devices cached."""
+        response = SOAPResponse(status_code=200, text='<root><Sink>http-get:*:audio/flac:*</Sink></root>')
+        first = DLNAClient(device_host="192.168.1.100", udn="uuid:first")
+        second = DLNAClient(device_host="192.168.1.101", udn="uuid:second")
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.return_value = response
+            first.detect_capabilities()
+            second.detect_capabilities()
+
+            DLNAClient.invalidate_capabilities_cache(udn="uuid:first")
+            first.detect_capabilities()
+            second.detect_capabilities()
+
+            assert mock_http.post.call_count == 3
+
+    def test_invalidate_capabilities_cache_by_host_without_port(self):
+        """A host without port should drop entries for every port of that host only."""
+        response = SOAPResponse(status_code=200, text='<root><Sink>http-get:*:audio/flac:*</Sink></root>')
+        clients = [
+            DLNAClient(device_host="192.168.1.100", device_port=55000),
+            DLNAClient(device_host="192.168.1.100", device_port=8080),
+            DLNAClient(device_host="192.168.1.101", device_port=55000),
+            DLNAClient(device_host="192.168.1.100", udn="uuid:renderer"),
+        ]
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.return_value = response
+            for c in clients:
+                c.detect_capabilities()
+
+            DLNAClient.invalidate_capabilities_cache("192.168.1.100")
+
+            for c in clients:
+                c.detect_capabilities()
+            assert mock_http.post.call_count == 6  # Only the two 192.168.1.100:<port> entries re-queried
+
+    def test_detect_capabilities_persisted_across_restarts(self, client, tmp_path, monkeypatch):
+        """Capabilities saved to the cache file should be reused after the in-memory cache is lost."""
+        monkeypatch.setattr('app.dlna_client._capabilities_file', None)
+        cache_file = str(tmp_path / 'capabilities.json')
+        DLNAClient.load_capabilities_cache(cache_file)
+        mock_response = SOAPResponse()
+        mock_response.status_code = 200
+        mock_response.text = '<root><Sink>http-get:*:audio/flac:*</Sink></root>'
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.return_value = mock_response
+            client.detect_capabilities()
+
+            # Simulate a restart: drop the in-memory cache without touching the file
+            monkeypatch.setattr('app.dlna_client._capabilities_file', None)
+            DLNAClient.invalidate_capabilities_cache()
+            DLNAClient.load_capabilities_cache(cache_file)
+
+            caps = DLNAClient(device_host="192.168.1.100", device_port=55000).detect_capabilities()
+            assert caps['supports_flac'] is True
+            assert mock_http.post.call_count == 1
+
+    def test_detect_capabilities_persisted_by_udn(self, tmp_path, monkeypatch):
+        """UDN-keyed entries should survive a restart under the same UDN only."""
+        monkeypatch.setattr('app.dlna_client._capabilities_file', None)
+        cache_file = str(tmp_path / 'capabilities.json')
+        DLNAClient.load_capabilities_cache(cache_file)
+        response = SOAPResponse(status_code=200, text='<root><Sink>http-get:*:audio/flac:*</Sink></root>')
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.return_value = response
+            DLNAClient(device_host="192.168.1.100", udn="uuid:renderer").detect_capabilities()
+
+            monkeypatch.setattr('app.dlna_client._capabilities_file', None)
+            DLNAClient.invalidate_capabilities_cache()
+            DLNAClient.load_capabilities_cache(cache_file)
+
+            DLNAClient(device_host="192.168.1.100", udn="uuid:renderer").detect_capabilities()
+            assert mock_http.post.call_count == 1
+            DLNAClient(device_host="192.168.1.100", udn="uuid:other").detect_capabilities()
+            assert mock_http.post.call_count == 2
+
+    def test_detect_many_queries_each_device(self):
+        """detect_many should key capabilities by UDN, or host:port so devices sharing an IP don't collide."""
+        clients = [
+            DLNAClient(device_host="192.168.1.10", device_port=55000),
+            DLNAClient(device_host="192.168.1.10", device_port=8080),
+            DLNAClient(device_host="192.168.1.11", device_port=55000, udn="uuid:renderer"),
+        ]
+        mock_response = SOAPResponse()
+        mock_response.status_code = 200
+        mock_response.text = '<root><Sink>http-get:*:audio/mpeg:*</Sink></root>'
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.return_value = mock_response
+
+            results = DLNAClient.detect_many(clients)
+
+        assert set(results) == {"192.168.1.10:55000", "192.168.1.10:8080", "uuid:renderer"}
+        assert all(caps['supports_mp3'] for caps in results.values())
+        assert DLNAClient.detect_many([]) == {}
+
     def test_can_play_format_mp3(self, client):
         """Should correctly identify MP3 playback capability."""
         client.capabilities = {'supports_mp3': True, 'supports_aac': False}
@@ -183,9 +343,10 @@ class TestDIDLMetadata:
     def test_set_av_transport_uri_soap_contains_escaped_didl(self):
         """SOAP body must contain XML-escaped DIDL-Lite, not raw XML."""
         client = DLNAClient(device_host='192.168.1.100')
-        mock_response = Mock()
+        mock_response = SOAPResponse()
         mock_response.status_code = 200
         mock_response.text = '<response>OK</response>'
+        mock_response.elapsed = timedelta(milliseconds=50)
 
         with patch('app.dlna_client.http_client') as mock_http:
             mock_http.post.return_value = mock_response
@@ -201,9 +362,10 @@ class TestDIDLMetadata:
     def test_set_av_transport_uri_soap_contains_current_uri_metadata(self):
         """SOAP body must include CurrentURIMetaData element."""
         client = DLNAClient(device_host='192.168.1.100')
-        mock_response = Mock()
+        mock_response = SOAPResponse()
         mock_response.status_code = 200
         mock_response.text = '<response>OK</response>'
+        mock_response.elapsed = timedelta(milliseconds=50)
 
         with patch('app.dlna_client.http_client') as mock_http:
             mock_http.post.return_value = mock_response
@@ -211,3 +373,186 @@ class TestDIDLMetadata:
 
             soap_body = mock_http.post.call_args[1]['data'].decode()
             assert '<CurrentURIMetaData>' in soap_body
+
+
+class TestTransportInfo:
+    """Tests for GetTransportInfo response handling."""
+
+    RESPONSE = '''<?xml version="1.0"?>
+    <s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+        <s:Body>
+            <u:GetTransportInfoResponse xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">
+                <CurrentTransportState>PLAYING</CurrentTransportState>
+                <CurrentTransportStatus>OK</CurrentTransportStatus>
+                <CurrentSpeed>1</CurrentSpeed>
+            </u:GetTransportInfoResponse>
+        </s:Body>
+    </s:Envelope>'''
+
+    def test_get_transport_info_reads_state_without_xml_parse(self):
+        """Well-formed responses should be read by the regex fast path."""
+        client = DLNAClient(device_host='192.168.1.100')
+
+        with patch('app.dlna_client.http_client') as mock_http, \
+                patch('app.dlna_client._find_elements_text') as mock_parse:
+            mock_http.post.return_value = SOAPResponse(status_code=200, text=self.RESPONSE)
+
+            assert client.get_transport_info() == {'state': 'PLAYING', 'status': 'OK'}
+            mock_parse.assert_not_called()
+
+    def test_get_transport_info_falls_back_to_xml_parse(self):
+        """Responses the fast path can't read should still be parsed as XML."""
+        client = DLNAClient(device_host='192.168.1.100')
+        response = self.RESPONSE.replace('<CurrentTransportStatus>OK</CurrentTransportStatus>',
+                                         '<CurrentTransportStatus />')
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.return_value = SOAPResponse(status_code=200, text=response)
+
+            assert client.get_transport_info()['state'] == 'PLAYING'
+
+    def test_play_url_sends_play_once_device_is_ready(self):
+        """play_url should poll the transport state instead of always sleeping the full prepare timeout."""
+        client = DLNAClient(device_host='192.168.1.100')
+        stopped = self.RESPONSE.replace('PLAYING', 'STOPPED')
+
+        with patch('app.dlna_client.http_client') as mock_http, \
+                patch('app.dlna_client.time.sleep') as mock_sleep:
+            mock_http.post.return_value = SOAPResponse(status_code=200, text=stopped, elapsed=timedelta(milliseconds=50))
+
+            assert client.play_url('http://192.168.1.10:5000/stream.mp3') is True
+            mock_sleep.assert_not_called()
+            actions = [call.kwargs['headers']['SOAPAction'] for call in mock_http.post.call_args_list]
+            assert [a.rsplit('#', 1)[1].strip('"') for a in actions] == ['SetAVTransportURI', 'GetTransportInfo', 'Play']
+
+    def test_wait_until_prepared_is_bounded_for_hanging_device(self):
+        """A device that accepts connections but never answers must not delay Play past the timeout."""
+        import socket
+        import time
+
+        with socket.socket() as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            host, port = server.getsockname()
+            client = DLNAClient(device_host=host, device_port=port)
+
+            started = time.monotonic()
+            client._wait_until_prepared(0.5)
+            elapsed = time.monotonic() - started
+
+        assert elapsed < 1.5
+
+    def test_wait_until_prepared_does_not_join_in_flight_request(self):
+        """Polls should send their own short request rather than wait on a slow get_transport_info()."""
+        client = DLNAClient(device_host='192.168.1.100')
+        client._transport_info_inflight = Mock()  # Would block if joined
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.return_value = SOAPResponse(status_code=200, text=self.RESPONSE)
+
+            client._wait_until_prepared(1.5)
+
+            client._transport_info_inflight.result.assert_not_called()
+            assert mock_http.post.call_args.kwargs['timeout'] <= 1.5
+
+    def test_get_transport_info_does_not_retry_client_errors(self):
+        """HTTP 4xx responses won't change on retry, so only one request should be made."""
+        client = DLNAClient(device_host='192.168.1.100')
+
+        with patch('app.dlna_client.http_client') as mock_http, \
+                patch('app.dlna_client.time.sleep') as mock_sleep:
+            mock_http.post.return_value = SOAPResponse(status_code=404, text='Not Found')
+
+            assert client.get_transport_info(retries=2) is None
+            assert mock_http.post.call_count == 1
+            mock_sleep.assert_not_called()
+
+    def test_get_transport_info_does_not_retry_refused_connection(self):
+        """A refused connection means nothing is listening - fail fast instead of backing off."""
+        from requests.exceptions import ConnectionError
+        client = DLNAClient(device_host='192.168.1.100')
+        error = ConnectionError("Max retries exceeded")
+        error.__cause__ = ConnectionRefusedError(111, 'Connection refused')
+
+        with patch('app.dlna_client.http_client') as mock_http, \
+                patch('app.dlna_client.time.sleep') as mock_sleep:
+            mock_http.post.side_effect = error
+
+            assert client.get_transport_info(retries=2) is None
+            assert mock_http.post.call_count == 1
+            mock_sleep.assert_not_called()
+
+    def test_get_transport_info_rejects_oversized_response(self):
+        """Huge responses should be dropped unparsed and not retried."""
+        client = DLNAClient(device_host='192.168.1.100')
+        padding = '<Filler>' + 'x' * (70 * 1024) + '</Filler>'
+        response = self.RESPONSE.replace('<CurrentSpeed>', padding + '<CurrentSpeed>')
+
+        with patch('app.dlna_client.http_client') as mock_http, \
+                patch('app.dlna_client._find_elements_text') as mock_parse:
+            mock_http.post.return_value = SOAPResponse(status_code=200, text=response)
+
+            assert client.get_transport_info(retries=2) is None
+            assert mock_http.post.call_count == 1
+            mock_parse.assert_not_called()
+
+    def test_concurrent_get_transport_info_calls_share_one_request(self):
+        """Callers arriving while a GetTransportInfo is in flight should reuse its result."""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        client = DLNAClient(device_host='192.168.1.100')
+        release = threading.Event()
+
+        def slow_post(*args, **kwargs):
+            release.wait(timeout=5)
+            return SOAPResponse(status_code=200, text=self.RESPONSE)
+
+        with patch('app.dlna_client.http_client') as mock_http:
+            mock_http.post.side_effect = slow_post
+
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                futures = [pool.submit(client.get_transport_info) for _ in range(3)]
+                while mock_http.post.call_count == 0:
+                    time.sleep(0.01)
+                time.sleep(0.05)  # Let the other callers join the in-flight request
+                release.set()
+                results = [f.result() for f in futures]
+
+            assert results == [{'state': 'PLAYING', 'status': 'OK'}] * 3
+            assert mock_http.post.call_count == 1
+
+
+class TestSOAPResponseParsing:
+    """Test SOAP response parsing with and without the optional lxml package."""
+
+    BODY = (
+        '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+        '<u:GetTransportInfoResponse xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">'
+        '<CurrentTransportState>PLAYING</CurrentTransportState>'
+        '</u:GetTransportInfoResponse></s:Body></s:Envelope>'
+    )
+
+    def test_parses_with_stdlib_without_lxml(self, fresh_import):
+        """Without lxml, the stdlib pull parser should be used without parser options."""
+        fresh = fresh_import('app.dlna_client', lxml=None)
+
+        assert fresh.ET is ElementTree
+        assert fresh._HAVE_LXML is False
+        assert fresh._find_elements_text(self.BODY, ('CurrentTransportState',)) == {
+            'CurrentTransportState': 'PLAYING'
+        }
+
+    def test_parses_with_hardened_lxml_when_installed(self, fresh_import):
+        """With lxml, the pull parser should never resolve entities or fetch DTDs."""
+        fake_etree = SimpleNamespace(XMLPullParser=Mock(side_effect=lambda events, **_: ElementTree.XMLPullParser(events)))
+        fresh = fresh_import('app.dlna_client', lxml=SimpleNamespace(etree=fake_etree))
+
+        assert fresh._HAVE_LXML is True
+        assert fresh._find_elements_text(self.BODY, ('CurrentTransportState',)) == {
+            'CurrentTransportState': 'PLAYING'
+        }
+        fake_etree.XMLPullParser.assert_called_once_with(
+            events=('end',), encoding='utf-8', resolve_entities=False, no_network=True
+        )
@@ -0,0 +1,774 @@
+"""Unit tests for HTTPClient."""
+
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from urllib3.util.retry import Retry
+
+from app import http_client as http_client_module
+from app.http_client import (
+    CircuitOpenError,
+    HTTPClient,
+    JitteredRetry,
+    _deadline,
+    _HTTPConnection,
+    _HTTPConnectionPool,
+    _resolve,
+)
+
+
+@pytest.fixture
+def client():
+    """Create an HTTPClient independent of the module-level singleton."""
+    instance = object.__new__(HTTPClient)
+    HTTPClient.__init__(instance)
+    yield instance
+    instance.close()
+
+
+@pytest.fixture
+def session(client):
+    """Replace the client's pooled session with a mock."""
+    mock_session = Mock()
+    with patch.object(client, '_get_session', return_value=mock_session):
+        yield mock_session
+
+
+@pytest.fixture
+def http_server():
+    """Serve canned responses from a local HTTP server; yields (base URL, handler class)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        status = 200
+        body = b'ok'
+        delay = 0.0
+        requests_seen = 0
+        client_ports: set[int] = set()  # One per TCP connection
+        posts: list[tuple[dict[str, str], bytes]] = []  # (headers, body) of each POST
+
+        def do_GET(self):
+            type(self).requests_seen += 1
+            self.client_ports.add(self.client_address[1])
+            time.sleep(self.delay)
+            self.send_response(self.status)
+            self.send_header('Content-Length', str(len(self.body)))
+            self.end_headers()
+            self.wfile.write(self.body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            self.posts.append((dict(self.headers), body))
+            self.do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', Handler
+    server.shutdown()
+    server.server_close()
+
+
+class TestSingleton:
+    """Test thread-safe creation of the shared client and its lazy session."""
+
+    def test_concurrent_construction_yields_one_initialized_instance(self, monkeypatch):
+        """Threads racing to create the client should all get the same, once-initialized instance."""
+        monkeypatch.setattr(HTTPClient, '_instance', None)
+        barrier = threading.Barrier(8)
+        instances = []
+
+        def create():
+            barrier.wait()
+            instances.append(HTTPClient())
+
+        with patch('app.http_client.BoundedSemaphore', wraps=threading.BoundedSemaphore) as bulkhead:
+            threads = [threading.Thread(target=create) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(5)
+
+        assert len(instances) == 8
+        assert all(i is instances[0] for i in instances)
+        assert bulkhead.call_count == 1  # __init__ body ran once
+
+    def test_session_created_on_first_request_only(self, client):
+        """No session should exist until first use, and concurrent first uses should share one."""
+        assert client._session is None
+        barrier = threading.Barrier(8)
+        sessions = []
+
+        def use():
+            barrier.wait()
+            sessions.append(client._get_session())
+
+        with patch('app.http_client.requests.Session', wraps=requests.Session) as session_cls:
+            threads = [threading.Thread(target=use) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(5)
+
+        assert session_cls.call_count == 1
+        assert all(s is client._session for s in sessions)
+
+
+class TestCircuitBreaker:
+    """Test the per-host circuit breaker."""
+
+    URL = 'http://192.168.1.100:8080/description.xml'
+
+    def _open_circuit(self, client, session):
+        session.get.side_effect = requests.ConnectionError("Connection refused")
+        for _ in range(HTTPClient._BREAKER_THRESHOLD):
+            with pytest.raises(requests.ConnectionError):
+                client.get(self.URL, fail_fast=True)
+
+    def _expire_recovery(self, client):
+        client._breakers['192.168.1.100:8080'].opened_at -= HTTPClient._BREAKER_RECOVERY
+
+    def test_opens_after_consecutive_failures(self, client, session):
+        """After the threshold, requests should fail fast without reaching the host."""
+        self._open_circuit(client, session)
+
+        with pytest.raises(CircuitOpenError):
+            client.get(self.URL, fail_fast=True)
+        assert session.get.call_count == HTTPClient._BREAKER_THRESHOLD
+
+    def test_other_hosts_are_unaffected(self, client, session):
+        """An open circuit should only block its own host."""
+        self._open_circuit(client, session)
+        session.get.side_effect = None
+
+        client.get('http://192.168.1.101:8080/description.xml', fail_fast=True)
+
+    def test_success_before_threshold_resets_failures(self, client, session):
+        """Failures only count while they are consecutive."""
+        session.get.side_effect = requests.ConnectionError("Connection refused")
+        for _ in range(HTTPClient._BREAKER_THRESHOLD - 1):
+            with pytest.raises(requests.ConnectionError):
+                client.get(self.URL, fail_fast=True)
+
+        session.get.side_effect = None
+        client.get(self.URL, fail_fast=True)
+
+        assert client._breakers == {}
+
+    def test_recovers_after_successful_trial_request(self, client, session):
+        """Once the recovery window has passed, a successful request closes the circuit."""
+        self._open_circuit(client, session)
+        self._expire_recovery(client)
+        session.get.side_effect = None
+
+        client.get(self.URL, fail_fast=True)
+        client.get(self.URL, fail_fast=True)
+
+        assert client._breakers == {}
+        assert session.get.call_count == HTTPClient._BREAKER_THRESHOLD + 2
+
+    def test_failed_trial_request_reopens_circuit(self, client, session):
+        """A failing trial request should start a new recovery window."""
+        self._open_circuit(client, session)
+        self._expire_recovery(client)
+
+        with pytest.raises(requests.ConnectionError):
+            client.get(self.URL, fail_fast=True)
+        with pytest.raises(CircuitOpenError):
+            client.get(self.URL, fail_fast=True)
+
+    def test_half_open_admits_a_single_trial_request(self, client, session):
+        """Callers arriving while the trial request is in flight should still be rejected."""
+        self._open_circuit(client, session)
+        self._expire_recovery(client)
+
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_get(*args, **kwargs):
+            started.set()
+            release.wait(timeout=5)
+            return Mock(status_code=200)
+
+        session.get.side_effect = slow_get
+        trial = threading.Thread(target=client.get, args=(self.URL,), kwargs={'fail_fast': True})
+        trial.start()
+        try:
+            assert started.wait(timeout=5)
+            with pytest.raises(CircuitOpenError):
+                client.get(self.URL, fail_fast=True)
+        finally:
+            release.set()
+            trial.join(timeout=5)
+
+        client.get(self.URL, fail_fast=True)
+        assert client._breakers == {}
+
+    def test_inconclusive_trial_request_admits_next_caller(self, client, session):
+        """A trial request failing with a non-connection error should not leave the circuit stuck."""
+        self._open_circuit(client, session)
+        self._expire_recovery(client)
+
+        session.get.side_effect = ValueError("Invalid header")
+        with pytest.raises(ValueError):
+            client.get(self.URL, fail_fast=True)
+
+        session.get.side_effect = None
+        client.get(self.URL, fail_fast=True)
+        assert client._breakers == {}
+
+    def test_not_used_without_fail_fast(self, client, session):
+        """Requests that don't opt in should neither count failures nor be rejected."""
+        self._open_circuit(client, session)
+
+        with pytest.raises(requests.ConnectionError) as excinfo:
+            client.get(self.URL)
+        assert not isinstance(excinfo.value, CircuitOpenError)
+
+        session.get.side_effect = None
+        client.get('http://radio.example/stream')
+        client.get('http://radio.example/stream')
+        assert 'radio.example' not in client._breakers
+
+    def test_read_timeouts_do_not_open_circuit(self, client, session):
+        """A host that accepts connections but answers slowly is reachable."""
+        session.get.side_effect = requests.ReadTimeout("Read timed out")
+        for _ in range(HTTPClient._BREAKER_THRESHOLD + 1):
+            with pytest.raises(requests.ReadTimeout):
+                client.get(self.URL, fail_fast=True)
+
+        assert client._breakers == {}
+
+    def test_retried_read_timeouts_do_not_open_circuit(self, client, http_server):
+        """Read timeouts that exhausted GET retries (raised as ConnectionError) are not connection failures."""
+        url, handler = http_server
+        handler.delay = 0.3
+
+        with patch.object(JitteredRetry, 'get_backoff_time', return_value=0):
+            with pytest.raises(requests.ConnectionError):
+                client.get(url, timeout=(1.0, 0.05), deadline=time.monotonic() + 5, fail_fast=True)
+
+        assert handler.requests_seen > 1  # Retried...
+        assert client._breakers == {}  # ...but not counted
+
+
+class TestJitteredRetry:
+    """Test full-jitter backoff and the deadline cut-off of the retry policy."""
+
+    def test_backoff_is_uniform_between_zero_and_exponential_backoff(self):
+        """Full jitter: sleep a random time in [0, backoff]."""
+        retry = JitteredRetry(total=3, backoff_factor=1)
+
+        with patch.object(Retry, 'get_backoff_time', return_value=4.0), \
+                patch('app.http_client.random.uniform', return_value=1.5) as mock_uniform:
+            assert retry.get_backoff_time() == 1.5
+            mock_uniform.assert_called_once_with(0, 4.0)
+
+    def test_backoff_stays_in_range(self):
+        """Sampled backoffs should spread over [0, backoff] instead of a fixed value."""
+        retry = JitteredRetry(total=3, backoff_factor=1)
+
+        with patch.object(Retry, 'get_backoff_time', return_value=4.0):
+            samples = {retry.get_backoff_time() for _ in range(50)}
+
+        assert all(0 <= s <= 4.0 for s in samples)
+        assert len(samples) > 1
+
+    def test_backoff_is_capped_by_deadline(self):
+        """Backoff should never sleep past the request deadline."""
+        retry = JitteredRetry(total=3, backoff_factor=1)
+        token = _deadline.set(time.monotonic() + 0.5)
+        try:
+            with patch.object(Retry, 'get_backoff_time', return_value=60.0):
+                assert all(retry.get_backoff_time() <= 0.5 for _ in range(20))
+        finally:
+            _deadline.reset(token)
+
+    def test_increment_stops_once_deadline_has_passed(self):
+        """No further attempt should be made after the deadline, even with retries left."""
+        retry = JitteredRetry(total=3, status_forcelist=[503])
+        token = _deadline.set(time.monotonic() - 1)
+        try:
+            with pytest.raises(MaxRetryError):
+                retry.increment(method='GET', url='/', response=Mock(status=503, headers={}))
+        finally:
+            _deadline.reset(token)
+
+    def test_increment_retries_before_deadline(self):
+        """Retries left and time left - a new retry state is returned."""
+        retry = JitteredRetry(total=3, status_forcelist=[503])
+        token = _deadline.set(time.monotonic() + 60)
+        try:
+            new_retry = retry.increment(method='GET', url='/', response=Mock(status=503, headers={}))
+        finally:
+            _deadline.reset(token)
+
+        assert new_retry.total == 2
+
+
+class TestDeadline:
+    """Test deadline propagation from HTTPClient to the retry policy."""
+
+    URL = 'http://192.168.1.100:8080/description.xml'
+
+    def _capture(self, seen):
+        def send(url, timeout, **kwargs):
+            seen.update(deadline=_deadline.get(), timeout=timeout)
+            return Mock(status_code=200)
+        return send
+
+    def test_default_deadline_is_read_timeout_from_now(self, client):
+        """Without an explicit deadline, the read timeout bounds the whole request."""
+        seen = {}
+        before = time.monotonic()
+        client._send(self._capture(seen), self.URL, 5, None)
+
+        assert before + 5 <= seen['deadline'] <= time.monotonic() + 5
+
+    def test_fail_fast_caps_connect_timeout(self, client):
+        """Device requests should give up on a dead host after _CONNECT_TIMEOUT."""
+        seen = {}
+        client._send(self._capture(seen), self.URL, 5, None, fail_fast=True)
+
+        assert seen['timeout'] == pytest.approx((2.0, 5), abs=0.01)
+
+    def test_connect_timeout_not_capped_by_default(self, client):
+        """Other hosts (e.g. internet radio streams) get the full timeout to connect."""
+        seen = {}
+        client._send(self._capture(seen), 'http://radio.example/stream', 5, None)
+
+        assert seen['timeout'] == pytest.approx(5, abs=0.01)
+
+    def test_explicit_deadline_clamps_timeouts(self, client):
+        """Per-attempt timeouts should shrink to the time left until the deadline."""
+        seen = {}
+        deadline = time.monotonic() + 0.5
+        client._send(self._capture(seen), self.URL, (2.0, 10.0), deadline)
+
+        assert seen['deadline'] == deadline
+        assert all(t <= 0.5 for t in seen['timeout'])
+
+    def test_deadline_is_reset_after_request(self, client):
+        """The deadline must not leak into later requests on the same thread."""
+        client._send(self._capture({}), self.URL, 5, None)
+
+        assert _deadline.get() is None
+
+    def test_expired_deadline_fails_without_sending(self, client):
+        """A request whose deadline already passed should raise Timeout immediately."""
+        send = Mock()
+
+        with pytest.raises(requests.Timeout):
+            client._send(send, self.URL, 5, time.monotonic() - 1)
+        send.assert_not_called()
+
+    def test_retries_stop_at_deadline(self, client, http_server):
+        """Retryable errors should only be retried while the deadline allows."""
+        url, handler = http_server
+        handler.status = 503
+        handler.delay = 0.2
+
+        started = time.monotonic()
+        with pytest.raises(requests.RequestException):
+            client.get(url, timeout=(1.0, 1.0), deadline=time.monotonic() + 0.3)
+
+        assert handler.requests_seen < 4  # Retry policy alone would make 4 attempts
+        assert time.monotonic() - started < 1.0
+
+    def test_retries_without_deadline_pressure(self, client, http_server):
+        """With time to spare, the retry policy should be used in full."""
+        url, handler = http_server
+        handler.status = 503
+
+        with patch.object(JitteredRetry, 'get_backoff_time', return_value=0):
+            with pytest.raises(requests.RequestException):
+                client.get(url, timeout=5)
+
+        assert handler.requests_seen == 4
+
+
+class TestDNSCache:
+    """Test the DNS cache used when opening pooled connections."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        """Start and end every test with an empty DNS cache."""
+        http_client_module._dns_cache.clear()
+        yield
+        http_client_module._dns_cache.clear()
+
+    @staticmethod
+    def _addrinfo(address):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, 80))]
+
+    def test_ip_literals_are_not_resolved(self):
+        """Renderer IPs should be used as-is without a lookup."""
+        with patch('app.http_client.socket.getaddrinfo') as mock_gai:
+            assert _resolve('192.168.1.100', 80) == '192.168.1.100'
+            assert _resolve('fe80::1', 80) == 'fe80::1'
+            mock_gai.assert_not_called()
+
+    def test_repeated_lookups_hit_cache(self):
+        """A name should be resolved once within the TTL."""
+        with patch('app.http_client.socket.getaddrinfo', return_value=self._addrinfo('10.0.0.5')) as mock_gai:
+            assert _resolve('renderer.lan', 80) == '10.0.0.5'
+            assert _resolve('renderer.lan', 80) == '10.0.0.5'
+            assert mock_gai.call_count == 1
+
+    def test_entries_expire_after_ttl(self):
+        """Once the TTL has passed, the name should be resolved again."""
+        with patch('app.http_client.socket.getaddrinfo', return_value=self._addrinfo('10.0.0.5')):
+            _resolve('renderer.lan', 80)
+
+        resolved_at, address = http_client_module._dns_cache['renderer.lan', 80]
+        http_client_module._dns_cache['renderer.lan', 80] = (resolved_at - http_client_module._DNS_TTL, address)
+
+        with patch('app.http_client.socket.getaddrinfo', return_value=self._addrinfo('10.0.0.6')) as mock_gai:
+            assert _resolve('renderer.lan', 80) == '10.0.0.6'
+            assert mock_gai.call_count == 1
+
+    def test_failed_lookup_falls_back_to_name_uncached(self):
+        """Resolution errors should be left to urllib3 and not be cached."""
+        with patch('app.http_client.socket.getaddrinfo', side_effect=socket.gaierror("Name or service not known")):
+            assert _resolve('missing.lan', 80) == 'missing.lan'
+
+        assert ('missing.lan', 80) not in http_client_module._dns_cache
+
+    def test_connections_use_cached_address(self, http_server):
+        """New connections to the same name should share one lookup."""
+        url, _ = http_server
+        port = int(url.rsplit(':', 1)[1])
+        lookups = []
+        real_getaddrinfo = socket.getaddrinfo
+
+        def counting_getaddrinfo(host, *args, **kwargs):
+            lookups.append(host)
+            return real_getaddrinfo(host, *args, **kwargs)
+
+        with patch('app.http_client.socket.getaddrinfo', side_effect=counting_getaddrinfo):
+            for _ in range(3):
+                conn = _HTTPConnection('localhost', port)
+                conn.request('GET', '/')
+                assert conn.getresponse().status == 200
+                assert conn.host == 'localhost'  # Host header and TLS still use the name
+                conn.close()
+
+        assert lookups.count('localhost') == 1
+
+    def test_failed_connect_drops_cached_address(self):
+        """A stale cached address should be resolved again after a connection failure."""
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]  # Closed again below - nothing listens there
+
+        http_client_module._dns_cache['renderer.lan', port] = (time.monotonic(), '127.0.0.1')
+        conn = _HTTPConnection('renderer.lan', port, timeout=1)
+
+        with pytest.raises(NewConnectionError):
+            conn.connect()
+        assert ('renderer.lan', port) not in http_client_module._dns_cache
+
+
+class TestConnectionPool:
+    """Test pool resizing and the idle cap of pooled connections."""
+
+    def test_idle_connections_are_reused(self, http_server):
+        """Connections idle for less than the cap should be kept alive."""
+        url, handler = http_server
+        pool = _HTTPConnectionPool('127.0.0.1', int(url.rsplit(':', 1)[1]), maxsize=1)
+
+        pool.urlopen('GET', '/')
+        pool.urlopen('GET', '/')
+
+        assert len(handler.client_ports) == 1
+        pool.close()
+
+    def test_connections_idle_past_cap_reconnect(self, http_server):
+        """A pooled connection idle longer than _MAX_IDLE_TIME should not be reused."""
+        url, handler = http_server
+        pool = _HTTPConnectionPool('127.0.0.1', int(url.rsplit(':', 1)[1]), maxsize=1)
+
+        pool.urlopen('GET', '/')
+        conn = pool.pool.queue[0]
+        conn.idle_since -= http_client_module._MAX_IDLE_TIME + 1
+        pool.urlopen('GET', '/')
+
+        assert len(handler.client_ports) == 2
+        pool.close()
+
+    def test_configure_resizes_tcp_adapter(self, client):
+        """New pool sizes should apply to the mounted adapter without replacing it."""
+        session = client._get_session()
+        adapter = session.adapters['http://']
+
+        client.configure(pool_connections=4, pool_maxsize=8)
+
+        assert session.adapters['http://'] is adapter
+        assert adapter.poolmanager.connection_pool_kw['maxsize'] == 8
+        assert adapter.poolmanager.pools._maxsize == 4
+
+    def test_configure_replaces_unix_socket_adapter(self, client):
+        """The Unix socket adapter should be rebuilt with the new sizes and the old one closed."""
+        fake_unixsocket = Mock()
+        old_adapter, new_adapter = Mock(), Mock()
+        fake_unixsocket.UnixAdapter.side_effect = [old_adapter, new_adapter]
+
+        with patch('app.http_client.requests_unixsocket', fake_unixsocket):
+            session = client._get_session()
+            assert session.adapters['http+unix://'] is old_adapter
+
+            client.configure(pool_connections=4, pool_maxsize=8)
+
+        assert session.adapters['http+unix://'] is new_adapter
+        fake_unixsocket.UnixAdapter.assert_called_with(pool_connections=4, pool_maxsize=8)
+        old_adapter.close.assert_called_once()
+
+
+class TestBulkhead:
+    """Test the bulkhead bounding concurrent requests to pool_maxsize."""
+
+    URL = 'http://192.168.1.100:8080/description.xml'
+
+    def test_callers_beyond_pool_maxsize_wait(self, client, session):
+        """Only pool_maxsize requests should be in flight; the rest block until one finishes."""
+        client.configure(pool_connections=1, pool_maxsize=2)
+        release = threading.Event()
+        in_flight, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow_get(url, **kwargs):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            release.wait(5)
+            with lock:
+                in_flight[0] -= 1
+            return Mock(status_code=200)
+
+        session.get.side_effect = slow_get
+        threads = [threading.Thread(target=client.get, args=(self.URL,)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        time.sleep(0.2)
+
+        assert in_flight[0] == 2  # Two callers are parked on the bulkhead
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        assert session.get.call_count == 4
+        assert peak[0] == 2
+
+    def test_slot_released_when_request_fails(self, client, session):
+        """A failing request must give its slot back."""
+        client.configure(pool_connections=1, pool_maxsize=2)
+        session.get.side_effect = requests.ConnectionError('refused')
+
+        for _ in range(3):
+            with pytest.raises(requests.ConnectionError):
+                client.get(self.URL)
+
+        assert all(client._bulkhead.acquire(blocking=False) for _ in range(2))
+
+
+class TestPreparedPost:
+    """Test the prepared-request fast path for raw-body POSTs."""
+
+    def test_bodies_of_different_lengths_get_their_own_content_length(self, client, http_server):
+        """A cached template must never send a previous body's Content-Length."""
+        url, handler = http_server
+        headers = {'Content-Type': 'text/xml; charset="utf-8"', 'SOAPAction': '"urn:x#Play"'}
+        bodies = [b'<a/>', b'<longer-body>' + b'x' * 100 + b'</longer-body>', b'<b/>']
+
+        for body in bodies:
+            assert client.post(f'{url}/ctrl', data=body, headers=headers).status_code == 200
+
+        assert [body for _, body in handler.posts] == bodies
+        assert [int(h['Content-Length']) for h, _ in handler.posts] == [len(b) for b in bodies]
+        assert len(client._prepared) == 1
+
+    def test_different_headers_to_same_url_are_not_mixed(self, client, http_server):
+        """Each headers dict should get its own template."""
+        url, handler = http_server
+        play = {'SOAPAction': '"urn:x#Play"'}
+        stop = {'SOAPAction': '"urn:x#Stop"'}
+
+        client.post(f'{url}/ctrl', data=b'<play/>', headers=play)
+        client.post(f'{url}/ctrl', data=b'<stop-longer/>', headers=stop)
+        client.post(f'{url}/ctrl', data=b'<play/>', headers=play)
+
+        assert [(h['SOAPAction'], int(h['Content-Length']), body) for h, body in handler.posts] == [
+            ('"urn:x#Play"', 7, b'<play/>'),
+            ('"urn:x#Stop"', 14, b'<stop-longer/>'),
+            ('"urn:x#Play"', 7, b'<play/>'),
+        ]
+
+    def test_template_is_not_modified_by_sending(self, client, http_server):
+        """Requests are sent from a copy, so the cached template keeps its first body."""
+        url, _ = http_server
+        headers = {'SOAPAction': '"urn:x#Play"'}
+
+        client.post(f'{url}/ctrl', data=b'<first/>', headers=headers)
+        client.post(f'{url}/ctrl', data=b'<second-body/>', headers=headers)
+
+        (_, template), = client._prepared.values()
+        assert template.body == b'<first/>'
+        assert template.headers['Content-Length'] == '8'
+
+    def test_other_posts_bypass_template_cache(self, client, http_server):
+        """Form data or extra options should go through Session.post as usual."""
+        url, handler = http_server
+
+        client.post(f'{url}/ctrl', data={'key': 'value'})
+        client.post(f'{url}/ctrl', data=b'<a/>', params={'q': '1'})
+
+        assert client._prepared == {}
+        assert [body for _, body in handler.posts] == [b'key=value', b'<a/>']
+
+
+class TestGetMany:
+    """Test parallel GETs over the shared session."""
+
+    def test_results_are_in_url_order(self, client, http_server):
+        """Each URL should get its own response, in the order the URLs were given."""
+        url, _ = http_server
+        urls = [f'{url}/{i}' for i in range(5)]
+
+        responses = client.get_many(urls)
+
+        assert [r.url for r in responses] == urls
+        assert all(r.status_code == 200 for r in responses)
+
+    def test_requests_run_in_parallel(self, client, http_server):
+        """Slow URLs should be fetched concurrently, not one after another."""
+        url, handler = http_server
+        handler.delay = 0.2
+
+        started = time.monotonic()
+        client.get_many([f'{url}/{i}' for i in range(4)])
+
+        assert time.monotonic() - started < 0.6  # Sequential fetching would take 0.8s
+        assert handler.requests_seen == 4
+
+    def test_failures_are_returned_in_place(self, client, http_server):
+        """A failing URL should not hide the results of the others."""
+        url, _ = http_server
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            closed_url = f'http://127.0.0.1:{probe.getsockname()[1]}/'  # Nothing listens there
+
+        ok, failed = client.get_many([url, closed_url], timeout=1)
+
+        assert ok.status_code == 200
+        assert isinstance(failed, requests.ConnectionError)
+
+    def test_no_urls(self, client):
+        """An empty batch should not start any threads."""
+        with patch('app.http_client.ThreadPoolExecutor') as mock_executor:
+            assert client.get_many([]) == []
+            mock_executor.assert_not_called()
+
+
+class TestStream:
+    """Test chunked downloads through stream()."""
+
+    def test_yields_body_in_chunks(self, client, http_server):
+        """The body should arrive in pieces of at most chunk_size bytes."""
+        url, handler = http_server
+        handler.body = bytes(range(256)) * 40
+
+        chunks = list(client.stream(url, chunk_size=1024))
+
+        assert b''.join(chunks) == handler.body
+        assert max(len(c) for c in chunks) <= 1024
+        assert len(chunks) == 10
+
+    def test_connection_is_reused_after_body_is_read(self, client, http_server):
+        """An exhausted stream should hand its keep-alive connection back to the pool."""
+        url, handler = http_server
+        handler.body = b'x' * 100_000
+
+        for _ in range(2):
+            for _ in client.stream(url):
+                pass
+
+        assert len(handler.client_ports) == 1
+
+    def test_closing_early_closes_response(self, client, session):
+        """Abandoning the generator should close the response instead of leaking it."""
+        response = session.get.return_value
+        response.__enter__ = Mock(return_value=response)
+        response.__exit__ = Mock(return_value=False)
+        response.iter_content.return_value = iter([b'a', b'b', b'c'])
+
+        chunks = client.stream('http://192.168.1.100:8080/stream')
+        assert next(chunks) == b'a'
+        chunks.close()
+
+        response.__exit__.assert_called_once()
+        assert session.get.call_args.kwargs['stream'] is True
+
+    def test_error_status_raises(self, client, http_server):
+        """An error page should raise instead of being streamed as content."""
+        url, handler = http_server
+        handler.status = 404
+
+        with pytest.raises(requests.HTTPError):
+            next(client.stream(url))
+
+
+class TestUnixSocket:
+    """Test the optional Unix domain socket transport."""
+
+    def test_no_unix_adapter_without_requests_unixsocket(self, fresh_import):
+        """Without requests-unixsocket, only the TCP adapters should be mounted."""
+        fresh = fresh_import('app.http_client', requests_unixsocket=None)
+        session = fresh.http_client._get_session()
+        try:
+            assert fresh.requests_unixsocket is None
+            assert 'http+unix://' not in session.adapters
+            assert isinstance(session.adapters['http://'], fresh._PooledAdapter)
+        finally:
+            fresh.http_client.close()
+
+    def test_unix_adapter_mounted_when_installed(self, fresh_import):
+        """With requests-unixsocket, http+unix:// URLs should get a pool sized like the TCP one."""
+        fake_unixsocket = Mock()
+        fresh = fresh_import('app.http_client', requests_unixsocket=fake_unixsocket)
+        session = fresh.http_client._get_session()
+        try:
+            assert session.adapters['http+unix://'] is fake_unixsocket.UnixAdapter.return_value
+            fake_unixsocket.UnixAdapter.assert_called_once_with(pool_connections=16, pool_maxsize=32)
+        finally:
+            fresh.http_client.close()
+
+    @pytest.mark.parametrize("sock_path, path, url", [
+        ('/tmp/dlna.sock', '/status?full=1', 'http+unix://%2Ftmp%2Fdlna.sock/status?full=1'),
+        ('/tmp/dlna.sock', 'status', 'http+unix://%2Ftmp%2Fdlna.sock/status'),
+        ('\0dlna-proxy', '/', 'http+unix://%00dlna-proxy/'),
+    ])
+    def test_get_unix_encodes_socket_path(self, client, sock_path, path, url):
+        """The socket path should be percent-encoded into the host part of an http+unix:// URL."""
+        with patch('app.http_client.requests_unixsocket', Mock()), \
+                patch.object(client, 'get') as mock_get:
+            client.get_unix(sock_path, path, timeout=3)
+
+        mock_get.assert_called_once_with(url, timeout=3)
+
+    def test_get_unix_requires_requests_unixsocket(self, client):
+        """Without the package, get_unix should fail clearly instead of sending a bogus URL."""
+        with patch('app.http_client.requests_unixsocket', None), \
+                patch.object(client, 'get') as mock_get:
+            with pytest.raises(RuntimeError, match="requests-unixsocket"):
+                client.get_unix('/tmp/dlna.sock')
+
+        mock_get.assert_not_called()
@@ -0,0 +1,83 @@
+"""Unit tests for stream format detection in the Flask app module."""
+
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.main import _background_device_scan, _detect_format_with_ffprobe
+
+FFPROBE_OUTPUT = json.dumps({'programs': [], 'streams': [{'codec_name': 'mp3'}]}).encode()
+
+
+@pytest.fixture
+def ffprobe():
+    """Mock the ffprobe subprocess with a successful run."""
+    with patch('app.main.subprocess.run') as mock_run:
+        mock_run.return_value = Mock(returncode=0, stdout=FFPROBE_OUTPUT, stderr=b'')
+        yield mock_run
+
+
+class TestFfprobeDetection:
+    """Test ffprobe fallback detection with and without the optional orjson package."""
+
+    def test_probes_first_audio_stream_only(self, ffprobe):
+        """ffprobe should only report the codec of the first audio stream, as raw bytes."""
+        with patch('app.main.orjson', None):
+            assert _detect_format_with_ffprobe('http://radio.example/stream') == 'audio/mpeg'
+
+        cmd = ffprobe.call_args.args[0]
+        assert cmd[cmd.index('-select_streams') + 1] == 'a:0'
+        assert cmd[cmd.index('-show_entries') + 1] == 'stream=codec_name'
+        assert 'text' not in ffprobe.call_args.kwargs
+
+    def test_parses_with_json_without_orjson(self, ffprobe):
+        """Without orjson, the output bytes should be parsed by the stdlib json module."""
+        with patch('app.main.orjson', None):
+            assert _detect_format_with_ffprobe('http://radio.example/stream') == 'audio/mpeg'
+
+    def test_parses_with_orjson_when_installed(self, ffprobe):
+        """With orjson installed, it should parse the output bytes."""
+        fake_orjson = Mock()
+        fake_orjson.loads.return_value = {'streams': [{'codec_name': 'flac'}]}
+
+        with patch('app.main.orjson', fake_orjson):
+            assert _detect_format_with_ffprobe('http://radio.example/stream') == 'audio/flac'
+
+        fake_orjson.loads.assert_called_once_with(FFPROBE_OUTPUT)
+
+    def test_no_audio_stream(self, ffprobe):
+        """A stream without audio should not be mapped to a MIME type."""
+        ffprobe.return_value.stdout = b'{"programs": [], "streams": []}'
+
+        assert _detect_format_with_ffprobe('http://radio.example/stream') is None
+
+    def test_failure_reports_undecodable_stderr(self, ffprobe):
+        """A failed run should be handled even if stderr isn't valid UTF-8."""
+        ffprobe.return_value = Mock(returncode=1, stdout=b'', stderr=b'Invalid data \xff')
+
+        assert _detect_format_with_ffprobe('http://radio.example/stream') is None
+
+
+class TestBackgroundDeviceScan:
+    """Test the startup device scan."""
+
+    def test_warms_capabilities_of_discovered_devices(self):
+        """Capabilities of every discovered device should be detected before auto-selecting one."""
+        devices = [
+            {'id': 'a', 'ip': '192.168.1.10', 'port': 55000, 'udn': 'uuid:a'},
+            {'id': 'b', 'ip': '192.168.1.10', 'port': 8080},
+        ]
+        calls = []
+
+        with patch('app.main.SSDPDiscovery.discover', return_value=devices), \
+                patch('app.main.device_manager'), \
+                patch('app.main.DLNAClient.detect_many', side_effect=lambda c: calls.append('detect')) as detect_many, \
+                patch('app.main._try_auto_select_default_device', side_effect=lambda: calls.append('select')):
+            _background_device_scan()
+
+        clients = detect_many.call_args.args[0]
+        assert [(c.device_host, c.device_port, c.udn) for c in clients] == [
+            ('192.168.1.10', 55000, 'uuid:a'), ('192.168.1.10', 8080, None)
+        ]
+        assert calls == ['detect', 'select']
@@ -30,6 +30,8 @@ class TestValidateIPAddress:
         "192.168.1.1' OR '1'='1",  # SQL injection attempt
         "192.168.1.1`whoami`",  # Command substitution
         "192.168.1.1\x00",  # Null byte
+        "192.168.1.1\n",  # Trailing newline
+        "192.168.01.1",  # Leading zero (ambiguous octal)
         "../192.168.1.1",  # Path traversal
         "192.168.1.1/24",  # CIDR notation
         "",  # Empty string